@@ -1,13 +1,16 @@
+import atexit
+import logging
 import os
+import threading
+import time
 from datetime import datetime
 from json import load
-from typing import List, Union
+from typing import List, Tuple, Union
 
 import chainlit as cl
 import openai
 from components.audio_handler import AudioHandler
 from dotenv import load_dotenv
-from llama_index.agent.openai import OpenAIAgent
 from llama_index.core import (
     Document,
     PromptTemplate,
@@ -17,17 +20,82 @@ from llama_index.core import (
     load_index_from_storage,
     set_global_handler,
 )
+from llama_index.core.agent import AgentRunner
 from llama_index.core.base.llms.types import ChatMessage
 from llama_index.core.callbacks import CallbackManager
 from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.storage.chat_store import SimpleChatStore
 from llama_index.core.tools import FunctionTool, QueryEngineTool, ToolMetadata
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.llms.openai import OpenAI
+from utils.context_compactor import (
+    RECIPE_CONTEXT_KEYS,
+    SUSTAINABILITY_CONTEXT_KEYS,
+    ContextCompactor,
+)
+from utils.hybrid_retriever import HybridRetriever
+from utils.meal_plan_optimizer import MealPlanOptimizer
+from utils.openai_pool import (
+    OpenAIClientPool,
+    background_priority,
+    model_limits_from_env,
+)
 from utils.recipe_extractor import RecipeExtractor
+from utils.recipe_recommender import RecipeRecommender
+from utils.single_flight import (
+    SingleFlight,
+    SingleFlightEmbedding,
+    SingleFlightQueryEngine,
+)
+from utils.streaming_ingestion import ingest_jsonl_index
+from utils.tool_scheduler import ParallelOpenAIAgentWorker, ToolScheduler
+
+
+def ingested_store_dir(index_name: str) -> str:
+    return f"./cache/{index_name}_stream"
+
+
+def load_or_ingest_jsonl_index(data_path: str, index_name: str):
+    """Serve a JSONL corpus from its streaming ingestion store.
+
+    The on-disk store is built with bounded memory and resumed on every start
+    (a finished store needs no API calls), but the index served from it, and
+    the BM25, meal plan and recommender data derived from it, are held in
+    memory, so the catalog must still fit in RAM.
+    """
+    # The ingestion runs in its own event loop, so it must not leave
+    # connections tied to that loop in the shared async client
+    async_http_client = openai_pool.new_async_http_client()
+    embed_model = OpenAIEmbedding(
+        model=EMBED_MODEL, **openai_pool.llama_index_kwargs(async_http_client)
+    )
+    # Index builds must not starve chat sessions of the shared OpenAI budget
+    with background_priority():
+        # The pool already rate limits the embedding calls
+        return ingest_jsonl_index(
+            data_path,
+            ingested_store_dir(index_name),
+            embed_model,
+            async_http_client=async_http_client,
+            requests_per_minute=None,
+        )
 
 
 def load_or_build_index(data_path: Union[str, List[str]], index_name: str):
+    if isinstance(data_path, str) and data_path.endswith(".jsonl"):
+        return load_or_ingest_jsonl_index(data_path, index_name)
+
+    try:
+        # rebuild storage context
+        storage_context = StorageContext.from_defaults(
+            persist_dir=f"./cache/{index_name}"
+        )
+        # load index
+        return load_index_from_storage(storage_context)
+    except:
+        pass
+
     if isinstance(data_path, List):
         json_data = []
         for path in data_path:
@@ -38,17 +106,10 @@ def load_or_build_index(data_path: Union[str, List[str]], index_name: str):
             json_data = load(json_file)
 
     documents = [Document(**i) for i in json_data]
-
-    try:
-        # rebuild storage context
-        storage_context = StorageContext.from_defaults(
-            persist_dir=f"./cache/{index_name}"
-        )
-        # load index
-        index = load_index_from_storage(storage_context)
-    except:
+    # Index builds must not starve chat sessions of the shared OpenAI budget
+    with background_priority():
         index = VectorStoreIndex.from_documents(documents)
-        index.storage_context.persist(f"./cache/{index_name}")
+    index.storage_context.persist(f"./cache/{index_name}")
 
     return index
 
@@ -65,42 +126,113 @@ VERBOSE_MODE = False
 load_dotenv()
 openai.api_key = os.environ.get("OPENAI_API_KEY")
 
-Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large")
+# Shared connection pool, per-model rate limits and retries for all OpenAI calls;
+# limits follow the API's x-ratelimit-* headers, OPENAI_MODEL_LIMITS sets them
+# up front
+openai_pool = OpenAIClientPool(
+    api_key=os.environ.get("OPENAI_API_KEY"), model_limits=model_limits_from_env()
+)
+
+# Coalesces identical concurrent tool, query engine and embedding calls across sessions
+request_coalescer = SingleFlight()
+REQUEST_STATS_INTERVAL = 600.0
+
+
+def log_request_stats() -> None:
+    """Log the upstream calls saved by coalescing and the OpenAI pool counters."""
+    logging.info(
+        f"Request coalescing (coalesced = calls saved): {request_coalescer.stats()}"
+    )
+    logging.info(f"OpenAI client pool: {openai_pool.stats()}")
+
+
+def log_request_stats_periodically() -> None:
+    while True:
+        time.sleep(REQUEST_STATS_INTERVAL)
+        log_request_stats()
+
+
+# Report the saved calls every REQUEST_STATS_INTERVAL seconds and on shutdown
+threading.Thread(
+    target=log_request_stats_periodically, name="request-stats", daemon=True
+).start()
+atexit.register(log_request_stats)
+
+EMBED_MODEL = "text-embedding-3-large"
+Settings.embed_model = SingleFlightEmbedding(
+    OpenAIEmbedding(model=EMBED_MODEL, **openai_pool.llama_index_kwargs()),
+    request_coalescer,
+)
 Settings.context_window = 4096
-TOP_K = 5
+# Hybrid retrieval ranks CANDIDATE_TOP_K nodes per ranker and keeps TOP_K after fusion
+TOP_K = 3
+CANDIDATE_TOP_K = 10
+CONTEXT_TOKEN_BUDGET = 600
 
 LLM = OpenAI(
     model="gpt-4o",
     temperature=0.7,
     max_tokens=1024,
     # streaming=True
+    **openai_pool.llama_index_kwargs(),
 )
 
 # Initialize recipe extractor
-recipe_extractor = RecipeExtractor(api_key=os.environ.get("OPENAI_API_KEY"))
+recipe_extractor = RecipeExtractor(client=openai_pool.client)
 
 # Initialize sustainability and recipe indices
 sustainability_index = load_or_build_index(
     "datasets/sustainability_data.json", "sustainability"
 )
-recipe_index = load_or_build_index("datasets/recipes.json", "recipes")
+RECIPE_DATA = "datasets/recipes.json"
+recipe_index = load_or_build_index(RECIPE_DATA, "recipes")
+
+# Personalized recommendations from swipe feedback, on top of the recipe index
+# vectors; an ingested JSONL catalog is read from its memory-mapped store
+if RECIPE_DATA.endswith(".jsonl"):
+    recipe_recommender = RecipeRecommender.from_ingested(
+        ingested_store_dir("recipes"), preferences_path="./cache/user_preferences.npz"
+    )
+else:
+    recipe_recommender = RecipeRecommender.from_index(
+        recipe_index, preferences_path="./cache/user_preferences.npz"
+    )
+# Write swipes that are still waiting for the batched save on shutdown
+atexit.register(recipe_recommender.users.save)
+
+# Picks the recipe combination that rescues the most at-risk food from the fridge
+meal_plan_optimizer = MealPlanOptimizer(
+    [doc.metadata for doc in recipe_index.docstore.docs.values()]
+)
 
-sustainability_query_engine = sustainability_index.as_query_engine(
+sustainability_query_engine = RetrieverQueryEngine.from_args(
+    HybridRetriever(
+        sustainability_index, similarity_top_k=TOP_K, candidate_top_k=CANDIDATE_TOP_K
+    ),
     llm=LLM,
+    node_postprocessors=[
+        ContextCompactor(SUSTAINABILITY_CONTEXT_KEYS, token_budget=CONTEXT_TOKEN_BUDGET)
+    ],
     text_qa_template=PromptTemplate(read_prompt("prompts/sustainability_prompt.md")),
-    similarity_top_k=TOP_K,
     verbose=VERBOSE_MODE,
 )
 
-recipe_query_engine = recipe_index.as_query_engine(
+recipe_query_engine = RetrieverQueryEngine.from_args(
+    HybridRetriever(
+        recipe_index, similarity_top_k=TOP_K, candidate_top_k=CANDIDATE_TOP_K
+    ),
     llm=LLM,
+    node_postprocessors=[
+        ContextCompactor(RECIPE_CONTEXT_KEYS, token_budget=CONTEXT_TOKEN_BUDGET)
+    ],
     text_qa_template=PromptTemplate(read_prompt("prompts/recipe_prompt.md")),
-    similarity_top_k=TOP_K,
     verbose=VERBOSE_MODE,
 )
 
 sustainability_tool = QueryEngineTool(
-    sustainability_query_engine,
+    SingleFlightQueryEngine(
+        sustainability_query_engine, request_coalescer, "sustainability_qa"
+    ),
     ToolMetadata(
         description="Tool to get sustainability information about ingredients and cooking methods",
         name="sustainability_qa",
@@ -109,7 +241,7 @@ sustainability_tool = QueryEngineTool(
 )
 
 recipe_tool = QueryEngineTool(
-    recipe_query_engine,
+    SingleFlightQueryEngine(recipe_query_engine, request_coalescer, "recipe_qa"),
     ToolMetadata(
         description="Tool to search and recommend recipes based on preferences and sustainability criteria",
         name="recipe_qa",
@@ -121,7 +253,12 @@ recipe_tool = QueryEngineTool(
 # Tool definitions
 def extract_recipe_from_url(url: str) -> dict:
     """Extract recipe information from a given URL."""
-    return recipe_extractor.extract_recipe_from_url(url)
+    return request_coalescer.do(
+        "extract_recipe_from_url",
+        url.strip().split("#")[0],
+        recipe_extractor.extract_recipe_from_url,
+        url,
+    )
 
 
 def calculate_sustainability_score(ingredients: List[dict]) -> dict:
@@ -156,23 +293,63 @@ def get_picnic_alternatives(ingredient: str) -> List[dict]:
     ]
 
 
+def preference_profile() -> Tuple[str, bool]:
+    """Recommendation profile key of the current user and whether to persist it.
+
+    Authenticated users keep their likes across chats; anonymous sessions get
+    a profile that only lasts for the session.
+    """
+    user = cl.user_session.get("user")
+    if user is not None:
+        return f"user:{user.identifier}", True
+    return f"session:{cl.user_session.get('id')}", False
+
+
 def get_recipe_recommendations(preferences: List[str]) -> List[dict]:
     """Get personalized recipe recommendations."""
-    # This would connect to your recipe recommendation system
-    return [
-        {
-            "title": "Veggie Pasta",
-            "sustainability_score": 8.5,
-            "matches_preferences": ["vegetarian", "quick"],
-            "ingredients": ["pasta", "tomatoes", "basil"],
-        },
-        {
-            "title": "Local Seasonal Salad",
-            "sustainability_score": 9.0,
-            "matches_preferences": ["local", "seasonal"],
-            "ingredients": ["lettuce", "carrots", "apples"],
-        },
-    ]
+    user_id, _ = preference_profile()
+    query_vector = (
+        Settings.embed_model.get_query_embedding(", ".join(preferences))
+        if preferences
+        else None
+    )
+
+    recommendations = []
+    for position in recipe_recommender.recommend(
+        user_id, k=5, query_vector=query_vector
+    ):
+        recipe_data = recipe_recommender.metadata[position]
+        tags = recipe_data.get("tags", [])
+        recommendations.append(
+            {
+                "title": recipe_data.get("title", "Unnamed Recipe"),
+                "sustainability_score": recipe_data.get("sustainability_score", 5.0),
+                "matches_preferences": [
+                    pref for pref in preferences if pref.lower() in tags
+                ],
+                "ingredients": [
+                    ing["name"] for ing in recipe_data.get("ingredients", [])
+                ],
+                "image_url": recipe_data.get("image_url", "default_recipe_image.jpg"),
+            }
+        )
+    return recommendations
+
+
+def swipe_actions(response) -> List[cl.Action]:
+    """Like/skip actions for the recipes returned by the tools of a response."""
+    actions = []
+    titles = []
+    for source in getattr(response, "sources", []):
+        if not isinstance(source.raw_output, list):
+            continue
+        for recipe in source.raw_output:
+            if isinstance(recipe, dict) and recipe.get("title") not in (None, *titles):
+                titles.append(recipe["title"])
+    for title in titles:
+        actions.append(cl.Action(name="like_recipe", value=title, label=f"👍 {title}"))
+        actions.append(cl.Action(name="skip_recipe", value=title, label=f"👎 {title}"))
+    return actions
 
 
 def get_recipes_from_ingredients(ingredients: List[str]) -> List[dict]:
@@ -289,6 +466,38 @@ def get_fridge_contents() -> List[dict]:
         return []
 
 
+def plan_meals_from_fridge(n_recipes: int = 3) -> dict:
+    """Plan n_recipes recipes that together use up the fridge items most at risk of being wasted, maximizing the CO2 rescued."""
+    fridge_contents = get_fridge_contents()
+    plan = meal_plan_optimizer.optimize(fridge_contents, n_recipes=n_recipes)
+    recipes = []
+    for planned in plan["recipes"]:
+        recipe_data = planned["recipe"]
+        recipes.append(
+            {
+                "title": planned["title"],
+                "matching_ingredients": planned["uses"],
+                "missing_ingredients": [
+                    ing["name"]
+                    for position, ing in enumerate(recipe_data.get("ingredients", []))
+                    if position not in planned["matched_ingredients"]
+                ],
+                "co2_rescued": planned["co2_rescued"],
+                "sustainability_score": recipe_data.get("sustainability_score", 5.0),
+                "image_url": recipe_data.get("image_url", "default_recipe_image.jpg"),
+                "preparation_time": recipe_data.get(
+                    "preparation_time", "Not specified"
+                ),
+                "difficulty": recipe_data.get("difficulty", "Medium"),
+            }
+        )
+    return {
+        "recipes": recipes,
+        "total_co2_rescued": plan["total_co2_rescued"],
+        "unused_items": plan["unused_items"],
+    }
+
+
 def analyze_fridge_contents() -> dict:
     """Analyze fridge contents with focus on sustainability and CO2 impact."""
     try:
@@ -327,9 +536,9 @@ def analyze_fridge_contents() -> dict:
         # Calculate driving equivalent (using 0.165 kg CO2 per km as conversion factor)
         driving_equivalent = round(total_co2_at_risk / 0.165, 1)
 
-        # Get recipe suggestions based on available ingredients
-        ingredient_names = [ing["name"] for ing in fridge_contents]
-        recipes = get_recipes_from_ingredients(ingredient_names)
+        # Suggest the recipe combination that rescues the most at-risk CO2
+        meal_plan = plan_meals_from_fridge()
+        recipes = meal_plan["recipes"]
 
         # Format analysis template
         analysis_template = read_prompt("prompts/analysis.md")
@@ -346,6 +555,7 @@ def analyze_fridge_contents() -> dict:
             "high_risk_items": high_risk_items,
             "total_co2_at_risk": total_co2_at_risk,
             "driving_equivalent": driving_equivalent,
+            "total_co2_rescued": meal_plan["total_co2_rescued"],
         }
     except Exception as e:
         return {"analysis": "Unable to analyze fridge contents", "recipes": []}
@@ -374,12 +584,22 @@ tools = [
             description="Analyze fridge contents, suggest recipes, and highlight items that need to be used soon.",
         ),
     ),
+    FunctionTool(
+        fn=plan_meals_from_fridge,
+        metadata=ToolMetadata(
+            name="meal_planner",
+            description="Plan a set of recipes that uses up the fridge items at risk of being wasted, maximizing the CO2 rescued. Input is the number of recipes to plan.",
+        ),
+    ),
     sustainability_tool,
     recipe_tool,
 ]
 
 # Initialize audio handler
-audio_handler = AudioHandler()
+audio_handler = AudioHandler(client=openai_pool.async_client)
+
+# Shared scheduler for running the tool calls of an agent step concurrently
+tool_scheduler = ToolScheduler(max_workers=8, timeout=60.0)
 
 
 @cl.on_chat_start
@@ -399,21 +619,27 @@ async def start():
     )
 
     # Initialize agent
-    agent = OpenAIAgent.from_tools(
+    agent_worker = ParallelOpenAIAgentWorker(
         tools=[
             FunctionTool.from_defaults(fn=extract_recipe_from_url),
             FunctionTool.from_defaults(fn=calculate_sustainability_score),
             FunctionTool.from_defaults(fn=get_picnic_alternatives),
             FunctionTool.from_defaults(fn=get_recipe_recommendations),
             FunctionTool.from_defaults(fn=get_recipes_from_ingredients),
+            FunctionTool.from_defaults(fn=plan_meals_from_fridge),
             sustainability_tool,
             recipe_tool,
         ],
         llm=LLM,
-        memory=memory,
-        system_prompt=read_prompt("prompts/agent_system_prompt.md"),
+        prefix_messages=[
+            ChatMessage(
+                content=read_prompt("prompts/agent_system_prompt.md"), role="system"
+            )
+        ],
         verbose=VERBOSE_MODE,
+        scheduler=tool_scheduler,
     )
+    agent = AgentRunner(agent_worker, memory=memory, llm=LLM)
 
     cl.user_session.set("agent", agent)
 
@@ -434,7 +660,7 @@ async def main(message: cl.Message):
         else:
             return
 
-    response = agent.chat(message.content)
+    response = await agent.achat(message.content)
     elements = []
 
     # Convert response to dictionary if it's not already
@@ -444,7 +670,9 @@ async def main(message: cl.Message):
             response_data = response.response
         else:
             # Send the text response directly if it's not a dictionary
-            await cl.Message(content=str(response.response)).send()
+            await cl.Message(
+                content=str(response.response), actions=swipe_actions(response)
+            ).send()
             return
 
     if "fridge_contents" in response_data:
@@ -495,7 +723,11 @@ async def main(message: cl.Message):
             )
 
         # Send the response with recipe cards
-        await cl.Message(content=str(response.response), elements=elements).send()
+        await cl.Message(
+            content=str(response.response),
+            elements=elements,
+            actions=swipe_actions(response),
+        ).send()
 
         # Send swipe suggestion
         await cl.Message(
@@ -504,3 +736,22 @@ async def main(message: cl.Message):
 
     elif response_data:  # If we have response data but no recipes
         await cl.Message(content=str(response_data)).send()
+
+
+async def record_swipe(action: cl.Action, liked: bool):
+    """Feed a like or skip into the user's recommendation profile."""
+    user_id, persist = preference_profile()
+    if recipe_recommender.record_feedback(user_id, action.value, liked, persist):
+        # Writes are batched, a burst of swipes results in a single save
+        recipe_recommender.users.request_save()
+    await action.remove()
+
+
+@cl.action_callback("like_recipe")
+async def on_like_recipe(action: cl.Action):
+    await record_swipe(action, liked=True)
+
+
+@cl.action_callback("skip_recipe")
+async def on_skip_recipe(action: cl.Action):
+    await record_swipe(action, liked=False)
@@ -0,0 +1,126 @@
+"""Synthesis prompt benchmark: full retrieved nodes vs ContextCompactor.
+
+Builds the gpt-4o text_qa prompt for each query from the hybrid retriever's
+nodes, once with the nodes as stored (all metadata) and once after context
+compaction, and reports prompt tokens and the compaction overhead. With
+OPENAI_API_KEY set, both prompts are also sent to gpt-4o to measure the
+end-to-end synthesis latency saved. Run from the chatbot directory:
+
+    python -m benchmarks.context_compaction
+"""
+
+import os
+import time
+from statistics import mean
+
+from dotenv import load_dotenv
+from llama_index.core import (
+    PromptTemplate,
+    QueryBundle,
+    Settings,
+    StorageContext,
+    load_index_from_storage,
+)
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import MetadataMode
+from llama_index.core.utils import get_tokenizer
+from utils.context_compactor import (
+    RECIPE_CONTEXT_KEYS,
+    SUSTAINABILITY_CONTEXT_KEYS,
+    ContextCompactor,
+)
+from utils.hybrid_retriever import HybridRetriever
+
+TOP_K = 3
+CONTEXT_TOKEN_BUDGET = 600
+
+CASES = {
+    "recipes": (
+        "prompts/recipe_prompt.md",
+        RECIPE_CONTEXT_KEYS,
+        [
+            "vegetarian recipe with Spring Onions",
+            "quick vegan breakfast under 20 minutes",
+            "what can I cook with red lentils and carrots",
+            "a warming winter soup",
+        ],
+    ),
+    "sustainability": (
+        "prompts/sustainability_prompt.md",
+        SUSTAINABILITY_CONTEXT_KEYS,
+        [
+            "are tomatoes seasonal in July",
+            "what is the carbon footprint of beef",
+            "alternatives to rice",
+        ],
+    ),
+}
+
+
+def build_prompt(template, results, query) -> str:
+    context = "\n\n".join(
+        result.node.get_content(metadata_mode=MetadataMode.LLM) for result in results
+    )
+    return template.format(context_str=context, query_str=query)
+
+
+def synthesis_latency(llm, prompt) -> float:
+    start = time.perf_counter()
+    llm.complete(prompt)
+    return time.perf_counter() - start
+
+
+def main():
+    load_dotenv()
+    llm = None
+    if os.environ.get("OPENAI_API_KEY"):
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        from llama_index.llms.openai import OpenAI
+
+        Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large")
+        llm = OpenAI(model="gpt-4o", temperature=0.7, max_tokens=1024)
+    else:
+        print("OPENAI_API_KEY not set, using mock embeddings, skipping gpt-4o\n")
+        Settings.embed_model = MockEmbedding(embed_dim=3072)
+    tokenizer = get_tokenizer()
+
+    for index_name, (prompt_path, keys, queries) in CASES.items():
+        index = load_index_from_storage(
+            StorageContext.from_defaults(persist_dir=f"./cache/{index_name}")
+        )
+        retriever = HybridRetriever(index, similarity_top_k=TOP_K)
+        compactor = ContextCompactor(keys, token_budget=CONTEXT_TOKEN_BUDGET)
+        with open(prompt_path) as prompt:
+            template = PromptTemplate(prompt.read())
+
+        full_tokens, compact_tokens, overheads, saved = [], [], [], []
+        for query in queries:
+            results = retriever.retrieve(QueryBundle(query))
+
+            start = time.perf_counter()
+            compacted = compactor.postprocess_nodes(results, QueryBundle(query))
+            overheads.append(time.perf_counter() - start)
+
+            full_prompt = build_prompt(template, results, query)
+            compact_prompt = build_prompt(template, compacted, query)
+            full_tokens.append(len(tokenizer(full_prompt)))
+            compact_tokens.append(len(tokenizer(compact_prompt)))
+            if llm is not None:
+                saved.append(
+                    synthesis_latency(llm, full_prompt)
+                    - synthesis_latency(llm, compact_prompt)
+                )
+
+        full, compact = mean(full_tokens), mean(compact_tokens)
+        print(f"[{index_name}] {len(queries)} queries, per query:")
+        print(f"  prompt tokens:       {full:.0f} -> {compact:.0f}")
+        print(
+            f"  tokens saved:        {full - compact:.0f} ({100 * (1 - compact / full):.0f}%)"
+        )
+        print(f"  compaction overhead: {mean(overheads) * 1000:.2f} ms")
+        if saved:
+            print(f"  gpt-4o latency saved: {mean(saved) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
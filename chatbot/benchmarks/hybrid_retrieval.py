@@ -0,0 +1,189 @@
+"""Retrieval benchmark: pure vector top-5 and top-3 vs hybrid BM25 + vector top-3.
+
+Every query is labelled with the recipes (or sustainability entries) that
+answer it. Reports hit@k (share of queries with at least one expected node
+retrieved), recall@k (share of expected nodes retrieved, out of at most k),
+retrieval latency and the number of context tokens that would be packed into
+the gpt-4o synthesis prompt. Vector top-3 separates the effect of fusion from
+that of the smaller k. Query embeddings are computed once up front so only
+retrieval itself is timed.
+
+With OPENAI_API_KEY the cached indices and text-embedding-3-large query
+embeddings are used. Without it, the indices are re-embedded with a local
+hashed bag-of-words embedding, so the vector ranking is lexical rather than
+semantic but not random. Run from the chatbot directory:
+
+    python -m benchmarks.hybrid_retrieval
+"""
+
+import os
+import time
+import zlib
+from statistics import mean
+from typing import List
+
+import numpy as np
+from dotenv import load_dotenv
+from llama_index.core import (
+    QueryBundle,
+    Settings,
+    StorageContext,
+    VectorStoreIndex,
+    load_index_from_storage,
+)
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.schema import MetadataMode
+from llama_index.core.utils import get_tokenizer
+from utils.hybrid_retriever import HybridRetriever
+from utils.meal_plan_optimizer import name_words
+
+VECTOR_TOP_K = 5
+HYBRID_TOP_K = 3
+ROUNDS = 20
+HASH_DIMENSIONS = 1024
+
+# Query -> titles (recipes) or ingredients (sustainability) that answer it
+QUERIES = {
+    "recipes": {
+        "vegetarian recipe with Spring Onions": {"Seasonal Potato Salad"},
+        "quick vegan breakfast under 20 minutes": {
+            "Green Smoothie Bowl",
+            "Apple Cinnamon Porridge",
+            "Carrot Cake Oatmeal",
+            "Overnight Oats",
+        },
+        "what can I cook with red lentils and carrots": {"Lentil Vegetable Curry"},
+        "a warming winter soup": {"Pumpkin Soup"},
+        "gluten-free dessert": {"Baked Apple Dessert", "Carrot Cake Oatmeal"},
+        "creamy pasta with mushrooms": {"Creamy Mushroom Pasta"},
+        "protein-rich bean chili for batch cooking": {"Three Bean Chili"},
+        "breakfast ideas, I am allergic to walnuts": {
+            "Overnight Oats",
+            "Green Smoothie Bowl",
+            "Homemade Granola",
+        },
+    },
+    "sustainability": {
+        "are tomatoes seasonal in July": {"Tomatoes"},
+        "what is the carbon footprint of beef": {"Beef"},
+        "alternatives to rice": {"Rice"},
+        "how long can potatoes be stored": {"Potatoes"},
+    },
+}
+
+
+class HashingEmbedding(BaseEmbedding):
+    """Offline stand-in: L2-normalized counts of hashed, singularized words."""
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(HASH_DIMENSIONS, dtype=np.float32)
+        for word in name_words(text):
+            vector[zlib.crc32(word.encode("utf-8")) % HASH_DIMENSIONS] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def label(node) -> str:
+    return node.metadata.get("title") or node.metadata.get("ingredient", "")
+
+
+def context_tokens(results, tokenizer) -> int:
+    context = "\n\n".join(
+        result.node.get_content(metadata_mode=MetadataMode.LLM) for result in results
+    )
+    return len(tokenizer(context))
+
+
+def timed(retriever, bundle):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        results = retriever.retrieve(bundle)
+    return (time.perf_counter() - start) / ROUNDS, results
+
+
+def load_index(index_name: str, offline: bool) -> VectorStoreIndex:
+    index = load_index_from_storage(
+        StorageContext.from_defaults(persist_dir=f"./cache/{index_name}")
+    )
+    if not offline:
+        return index
+    nodes = [
+        node.model_copy(update={"embedding": None})
+        for node in index.docstore.docs.values()
+    ]
+    return VectorStoreIndex(nodes)
+
+
+def main():
+    load_dotenv()
+    offline = not os.environ.get("OPENAI_API_KEY")
+    if offline:
+        print("OPENAI_API_KEY not set, using a local hashed bag-of-words embedding\n")
+        Settings.embed_model = HashingEmbedding()
+    else:
+        from llama_index.embeddings.openai import OpenAIEmbedding
+
+        Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large")
+    tokenizer = get_tokenizer()
+
+    for index_name, queries in QUERIES.items():
+        index = load_index(index_name, offline)
+        retrievers = {
+            f"vector top-{VECTOR_TOP_K}": (
+                VectorIndexRetriever(index, similarity_top_k=VECTOR_TOP_K),
+                VECTOR_TOP_K,
+            ),
+            f"vector top-{HYBRID_TOP_K}": (
+                VectorIndexRetriever(index, similarity_top_k=HYBRID_TOP_K),
+                HYBRID_TOP_K,
+            ),
+            f"hybrid top-{HYBRID_TOP_K}": (
+                HybridRetriever(index, similarity_top_k=HYBRID_TOP_K),
+                HYBRID_TOP_K,
+            ),
+        }
+
+        rows = {name: [] for name in retrievers}
+        for query, expected in queries.items():
+            bundle = QueryBundle(
+                query, embedding=Settings.embed_model.get_query_embedding(query)
+            )
+            for name, (retriever, k) in retrievers.items():
+                seconds, results = timed(retriever, bundle)
+                found = expected & {label(result.node) for result in results}
+                rows[name].append(
+                    (
+                        bool(found),
+                        len(found) / min(len(expected), k),
+                        seconds,
+                        context_tokens(results, tokenizer),
+                    )
+                )
+
+        print(f"[{index_name}] {len(queries)} labelled queries")
+        baseline_tokens = None
+        for name, columns in rows.items():
+            hits, recall, seconds, tokens = (mean(column) for column in zip(*columns))
+            line = (
+                f"  {name}: hit@k {hits:.2f}, recall@k {recall:.2f}, "
+                f"{seconds * 1000:.2f} ms, {tokens:.0f} context tokens"
+            )
+            if baseline_tokens is None:
+                baseline_tokens = tokens
+            else:
+                line += f" ({100 * (1 - tokens / baseline_tokens):.0f}% fewer)"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Meal plan optimizer scaling benchmark.
+
+Generates synthetic recipe corpora of increasing size over a shared ingredient
+vocabulary and a fridge of at-risk items, then reports index build time and
+the latency and CO2 rescued of greedy vs branch-and-bound plans. Run from the
+chatbot directory:
+
+    python -m benchmarks.meal_plan_optimizer
+"""
+
+import time
+
+import numpy as np
+from utils.meal_plan_optimizer import MealPlanOptimizer
+
+CORPUS_SIZES = [1_000, 5_000, 20_000, 100_000]
+N_INGREDIENTS = 400
+INGREDIENTS_PER_RECIPE = (5, 12)
+N_FRIDGE_ITEMS = 15
+PLAN_SIZES = [3, 5]
+REPEATS = 3
+
+
+def ingredient_name(index):
+    # Ingredient names are matched by their alphabetic words
+    letters = ""
+    while True:
+        index, remainder = divmod(index, 26)
+        letters += chr(ord("a") + remainder)
+        if not index:
+            return f"ingredient {letters}"
+
+
+def make_recipes(n_recipes, rng):
+    recipes = []
+    for i in range(n_recipes):
+        count = rng.integers(*INGREDIENTS_PER_RECIPE)
+        # Zipf-like popularity, so common ingredients appear in many recipes
+        names = set(rng.zipf(1.3, count * 2) % N_INGREDIENTS)
+        recipes.append(
+            {
+                "title": f"Recipe {i}",
+                "ingredients": [
+                    {
+                        "name": ingredient_name(name),
+                        "amount": int(rng.integers(50, 600)),
+                        "unit": "g",
+                    }
+                    for name in list(names)[:count]
+                ],
+            }
+        )
+    return recipes
+
+
+def make_fridge(rng):
+    return [
+        {
+            "name": ingredient_name(name),
+            "amount": f"{rng.uniform(0.2, 1.0):.2f}kg",
+            "risk_percentage": float(rng.uniform(0, 60)),
+            "co2_impact": float(rng.uniform(0.2, 5.0)),
+        }
+        for name in rng.choice(N_INGREDIENTS // 4, N_FRIDGE_ITEMS, replace=False)
+    ]
+
+
+def best_time(fn):
+    times = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1000, result
+
+
+def main():
+    rng = np.random.default_rng(0)
+    fridge = make_fridge(rng)
+    print(f"{N_FRIDGE_ITEMS} fridge items, {N_INGREDIENTS} ingredient vocabulary")
+
+    for n_recipes in CORPUS_SIZES:
+        recipes = make_recipes(n_recipes, rng)
+        build_ms, optimizer = best_time(lambda: MealPlanOptimizer(recipes))
+        print(f"[{n_recipes} recipes] index build {build_ms:.0f} ms")
+
+        for plan_size in PLAN_SIZES:
+            greedy_ms, greedy = best_time(
+                lambda: optimizer.optimize(fridge, plan_size, exact=False)
+            )
+            exact_ms, exact = best_time(
+                lambda: optimizer.optimize(fridge, plan_size, exact=True)
+            )
+            print(
+                f"  N={plan_size} ({exact['candidates']} candidates): "
+                f"greedy {greedy_ms:.1f} ms -> {greedy['total_co2_rescued']:.3f} kg, "
+                f"branch-and-bound {exact_ms:.1f} ms -> "
+                f"{exact['total_co2_rescued']:.3f} kg"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Shared OpenAI client pool benchmark against a local stand-in server.
+
+Starts a local HTTP server that mimics the OpenAI chat completion and
+embedding endpoints, including a per-model request rate limit answered with
+429 + retry-after-ms and occasional 503s. While a background index build
+floods the embedding endpoint, interactive chat turns (query embedding +
+chat completion) arrive at a steady pace. Compares one OpenAI SDK client per
+component with the shared OpenAIClientPool and reports chat turn latency,
+failed calls, 429s seen by the server and TCP connections opened. No API key
+or network access is needed. Run from the chatbot directory:
+
+    python -m benchmarks.openai_pool
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from openai import AsyncOpenAI
+from utils.openai_pool import OpenAIClientPool, background_priority
+
+# Stand-in server behaviour
+REQUESTS_PER_SECOND = 40
+ERROR_RATE = 0.02
+LATENCY = {"/v1/embeddings": 0.05, "/v1/chat/completions": 0.2}
+
+# Workload
+BACKGROUND_REQUESTS = 300
+BACKGROUND_CONCURRENCY = 32
+CHAT_TURNS = 30
+CHAT_INTERVAL = 0.15
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Local OpenAI stand-in, also used by tests/test_openai_pool.py.
+
+    `script` holds status codes answered to the next requests before the
+    normal behaviour resumes, `headers` is sent with every response and
+    `requests` logs (path, request body) in arrival order.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        requests_per_second: float = REQUESTS_PER_SECOND,
+        error_rate: float = ERROR_RATE,
+        headers: dict = None,
+    ):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.requests_per_second = requests_per_second
+        self.error_rate = error_rate
+        self.headers = headers or {}
+        self.lock = threading.Lock()
+        self.script = []
+        self.reset()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def reset(self):
+        with self.lock:
+            self.connections = self.rate_limited = 0
+            self.buckets = {}
+            self.requests = []
+
+    def log(self, path: str, request: dict):
+        """Record the request; returns the scripted status to answer, if any."""
+        with self.lock:
+            self.requests.append((path, request))
+            return self.script.pop(0) if self.script else None
+
+    def allow(self, model: str) -> bool:
+        """Per-model token bucket holding one second worth of requests."""
+        rate = self.requests_per_second
+        with self.lock:
+            now = time.monotonic()
+            available, updated = self.buckets.get(model, (rate, now))
+            available = min(rate, available + (now - updated) * rate)
+            allowed = available >= 1
+            self.buckets[model] = (available - allowed, now)
+            self.rate_limited += not allowed
+            return allowed
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        for name, value in dict(self.server.headers, **(headers or {})).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        model = request["model"]
+        status = self.server.log(self.path, request)
+        if status is None and not self.server.allow(model):
+            status = 429
+        if status == 429:
+            return self.send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                {"retry-after-ms": "100"},
+            )
+        if status is None and random.random() < self.server.error_rate:
+            status = 503
+        if status is not None:
+            return self.send_json(status, {"error": {"message": "Overloaded"}})
+
+        time.sleep(LATENCY.get(self.path, 0.05))
+        usage = {"prompt_tokens": 10, "total_tokens": 10}
+        if self.path == "/v1/embeddings":
+            inputs = request["input"]
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            return self.send_json(
+                200,
+                {
+                    "object": "list",
+                    "model": model,
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": [0.1] * 8}
+                        for i in range(len(inputs))
+                    ],
+                    "usage": usage,
+                },
+            )
+        self.send_json(
+            200,
+            {
+                "id": "chatcmpl-standin",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "Sure!"},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": dict(usage, completion_tokens=2),
+            },
+        )
+
+
+async def background_build(client: AsyncOpenAI, failures: list):
+    queue = asyncio.Queue()
+    for i in range(BACKGROUND_REQUESTS):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            try:
+                await client.embeddings.create(
+                    model="text-embedding-3-large",
+                    input=[f"recipe {i} chunk {j}" for j in range(16)],
+                )
+            except Exception:
+                failures.append(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(BACKGROUND_CONCURRENCY)))
+    return time.perf_counter() - started
+
+
+async def chat_turn(client: AsyncOpenAI, i: int) -> float:
+    started = time.perf_counter()
+    await client.embeddings.create(
+        model="text-embedding-3-large", input=f"vegan recipe with leeks {i}"
+    )
+    await client.chat.completions.create(
+        model="gpt-4o",
+        messages=[{"role": "user", "content": f"What can I cook with leeks? {i}"}],
+        max_tokens=256,
+    )
+    return time.perf_counter() - started
+
+
+async def run(background_client: AsyncOpenAI, chat_client: AsyncOpenAI, pooled: bool):
+    background_failures, chat_latencies, chat_failures = [], [], 0
+
+    async def build():
+        if not pooled:
+            return await background_build(background_client, background_failures)
+        with background_priority():
+            return await background_build(background_client, background_failures)
+
+    build_task = asyncio.ensure_future(build())
+    await asyncio.sleep(0.5)
+
+    async def turn(i):
+        nonlocal chat_failures
+        await asyncio.sleep(i * CHAT_INTERVAL)
+        try:
+            chat_latencies.append(await chat_turn(chat_client, i))
+        except Exception:
+            chat_failures += 1
+
+    await asyncio.gather(*(turn(i) for i in range(CHAT_TURNS)))
+    build_seconds = await build_task
+    return build_seconds, background_failures, chat_latencies, chat_failures
+
+
+def report(name, server, build_seconds, background_failures, latencies, failures):
+    latencies = np.array(latencies) * 1000
+    print(f"[{name}]")
+    print(
+        f"  chat turn latency:   p50 {np.percentile(latencies, 50):.0f} ms, "
+        f"p95 {np.percentile(latencies, 95):.0f} ms, failed {failures}/{CHAT_TURNS}"
+    )
+    print(
+        f"  background build:    {build_seconds:.1f} s, "
+        f"failed {len(background_failures)}/{BACKGROUND_REQUESTS}"
+    )
+    print(
+        f"  server:              {server.rate_limited} x 429, "
+        f"{server.connections} TCP connections"
+    )
+
+
+async def main():
+    server = StandInServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = server.base_url
+    print(
+        f"Stand-in server: {REQUESTS_PER_SECOND} req/s per model, "
+        f"{ERROR_RATE:.0%} 503s; {BACKGROUND_REQUESTS} background embedding "
+        f"batches, {CHAT_TURNS} chat turns"
+    )
+
+    # Before: every component builds its own client with the SDK's retries
+    random.seed(0)
+    background_client = AsyncOpenAI(api_key="test", base_url=base_url)
+    chat_client = AsyncOpenAI(api_key="test", base_url=base_url)
+    results = await run(background_client, chat_client, pooled=False)
+    report("separate clients", server, *results)
+    await background_client.close()
+    await chat_client.close()
+
+    # After: one shared pool, index build marked as background work
+    random.seed(0)
+    server.reset()
+    pool = OpenAIClientPool(
+        api_key="test",
+        base_url=base_url,
+        model_limits={
+            "text-embedding-3-large": (REQUESTS_PER_SECOND * 60, 10_000_000),
+            "gpt-4o": (REQUESTS_PER_SECOND * 60, 10_000_000),
+        },
+        burst_seconds=1.0,
+    )
+    results = await run(pool.async_client, pool.async_client, pooled=True)
+    report("shared pool", server, *results)
+    print(f"  pool stats:          {pool.stats()}")
+    await pool.aclose()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""Recommender benchmark: 100k recipes x many users.
+
+Uses clustered random vectors in place of recipe embeddings and reports, for
+several truncation dimensions, swipe update latency, single user ranking
+latency, recall of the IVF ranking against an exact full scan and the size of
+the persisted preference file. Run from the chatbot directory:
+
+    python -m benchmarks.recipe_recommender
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+from utils.recipe_recommender import RecipeRecommender
+
+N_RECIPES = 100_000
+N_USERS = 10_000
+SWIPES_PER_USER = 20
+N_QUERIES = 1_000
+N_TOPICS = 500
+DIMENSIONS = [256, 128, 64]
+
+
+def percentile_ms(samples, q):
+    return np.percentile(samples, q) * 1000
+
+
+def run(dimensions, ids, embeddings, metadata, rng):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "user_preferences.npz")
+        started = time.perf_counter()
+        recommender = RecipeRecommender(
+            ids, embeddings, metadata, dimensions=dimensions, preferences_path=path
+        )
+        build = time.perf_counter() - started
+
+        update_times = []
+        for user in range(N_USERS):
+            for recipe in rng.integers(0, N_RECIPES, SWIPES_PER_USER):
+                start = time.perf_counter()
+                recommender.record_feedback(
+                    f"user-{user}", ids[recipe], liked=bool(recipe % 2)
+                )
+                update_times.append(time.perf_counter() - start)
+
+        query_times, hits = [], 0
+        for user in rng.integers(0, N_USERS, N_QUERIES):
+            start = time.perf_counter()
+            top = recommender.recommend(f"user-{user}", k=5)
+            query_times.append(time.perf_counter() - start)
+            scores = recommender.scores(f"user-{user}")
+            seen = [
+                recommender.position(r) for r in recommender.users.seen[f"user-{user}"]
+            ]
+            scores[seen] = -np.inf
+            hits += len(set(top) & set(np.argsort(-scores)[:5].tolist()))
+
+        started = time.perf_counter()
+        recommender.users.save()
+        save = time.perf_counter() - started
+        size = os.path.getsize(path)
+
+    print(f"[{dimensions} dims]")
+    print(
+        f"  matrix build:      {build * 1000:.0f} ms "
+        f"({recommender.matrix.nbytes / 2**20:.0f} MB)"
+    )
+    print(
+        f"  swipe update:      p50 {percentile_ms(update_times, 50):.3f} ms, "
+        f"p99 {percentile_ms(update_times, 99):.3f} ms"
+    )
+    print(
+        f"  recommend (top-5): p50 {percentile_ms(query_times, 50):.3f} ms, "
+        f"p99 {percentile_ms(query_times, 99):.3f} ms"
+    )
+    print(f"  recall@5 vs exact: {hits / (5 * N_QUERIES):.3f}")
+    print(f"  persist users:     {save * 1000:.0f} ms, {size / 2**20:.1f} MB")
+
+
+def main():
+    rng = np.random.default_rng(0)
+    # Recipes cluster around topics (cuisines, main ingredients) like real embeddings
+    topics = rng.standard_normal((N_TOPICS, max(DIMENSIONS)), dtype=np.float32)
+    embeddings = topics[
+        rng.integers(0, N_TOPICS, N_RECIPES)
+    ] + 0.5 * rng.standard_normal((N_RECIPES, max(DIMENSIONS)), dtype=np.float32)
+    metadata = [
+        {"title": f"Recipe {i}", "sustainability_score": float(rng.uniform(3, 10))}
+        for i in range(N_RECIPES)
+    ]
+    ids = [f"recipe-{i}" for i in range(N_RECIPES)]
+
+    print(f"{N_RECIPES} recipes, {N_USERS} users x {SWIPES_PER_USER} swipes")
+    for dimensions in DIMENSIONS:
+        run(dimensions, ids, embeddings, metadata, rng)
+
+
+if __name__ == "__main__":
+    main()
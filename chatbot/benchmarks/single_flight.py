@@ -0,0 +1,86 @@
+"""Single-flight benchmark: identical concurrent requests from many sessions.
+
+Simulates SESSIONS chat sessions asking the same recipe question at once, via
+the async query engine path (agent tools) and via thread pool callers (sync
+function tools such as URL extraction), and reports how many upstream calls
+were actually made. Run from the chatbot directory:
+
+    python -m benchmarks.single_flight
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llama_index.core.query_engine import CustomQueryEngine
+from utils.single_flight import SingleFlight, SingleFlightQueryEngine
+
+SESSIONS = 50
+UPSTREAM_LATENCY = 0.3
+
+
+class SlowQueryEngine(CustomQueryEngine):
+    """Stand-in for retrieval + gpt-4o synthesis."""
+
+    calls: int = 0
+
+    def custom_query(self, query_str: str) -> str:
+        self.calls += 1
+        time.sleep(UPSTREAM_LATENCY)
+        return f"answer to {query_str}"
+
+    async def acustom_query(self, query_str: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(UPSTREAM_LATENCY)
+        return f"answer to {query_str}"
+
+
+async def run_async(engine) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[engine.aquery("vegan recipe with  Spring Onions") for _ in range(SESSIONS)]
+    )
+    return time.perf_counter() - start
+
+
+def run_threads(fn) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SESSIONS) as pool:
+        list(pool.map(lambda _: fn(), range(SESSIONS)))
+    return time.perf_counter() - start
+
+
+def report(label, calls, elapsed):
+    print(
+        f"  {label:<14} upstream calls: {calls:>3}, wall time: {elapsed * 1000:.0f} ms"
+    )
+
+
+def main():
+    print(f"{SESSIONS} concurrent identical requests, {UPSTREAM_LATENCY}s upstream\n")
+
+    print("async query engine path")
+    plain = SlowQueryEngine()
+    elapsed = asyncio.run(run_async(plain))
+    report("direct", plain.calls, elapsed)
+    flight = SingleFlight()
+    inner = SlowQueryEngine()
+    elapsed = asyncio.run(
+        run_async(SingleFlightQueryEngine(inner, flight, "recipe_qa"))
+    )
+    report("single-flight", inner.calls, elapsed)
+
+    print("thread pool path")
+    plain = SlowQueryEngine()
+    elapsed = run_threads(lambda: plain.query("vegan recipe with Spring Onions"))
+    report("direct", plain.calls, elapsed)
+    inner = SlowQueryEngine()
+    engine = SingleFlightQueryEngine(inner, flight, "recipe_qa")
+    elapsed = run_threads(lambda: engine.query("vegan recipe with Spring Onions"))
+    report("single-flight", inner.calls, elapsed)
+
+    print("\nstats:", flight.stats())
+
+
+if __name__ == "__main__":
+    main()
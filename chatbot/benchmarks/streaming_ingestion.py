@@ -0,0 +1,150 @@
+"""Ingestion benchmark: streaming JSONL ingestion vs load_or_build_index.
+
+Generates a synthetic corpus by repeating datasets/recipes.json, then ingests
+it in separate processes, once the way load_or_build_index does it (json.load,
+materialise all Documents, VectorStoreIndex.from_documents) and once with the
+StreamingIngestor, reporting documents/second and peak RSS. A mock embedding
+with a fixed per-batch latency stands in for the OpenAI API. The streaming run
+is interrupted halfway once to exercise checkpoint/resume. Run from the
+chatbot directory:
+
+    python -m benchmarks.streaming_ingestion [n_documents]
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+from llama_index.core import Document, Settings, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from utils.streaming_ingestion import StreamingIngestor, peak_rss_mb
+
+N_DOCUMENTS = 20_000
+DIMENSIONS = 3072
+BATCH_SIZE = 100
+BATCH_LATENCY = 0.05
+
+
+class SlowMockEmbedding(MockEmbedding):
+    """Mock embedding with a fixed latency per API request."""
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(BATCH_LATENCY)
+        return super()._get_text_embeddings(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(BATCH_LATENCY)
+        return super()._get_text_embeddings(texts)
+
+
+def write_corpus(directory: str, n_documents: int) -> str:
+    with open("datasets/recipes.json", "r") as json_file:
+        recipes = json.load(json_file)
+    json_path = os.path.join(directory, "corpus.json")
+    jsonl_path = os.path.join(directory, "corpus.jsonl")
+    records = []
+    for i in range(n_documents):
+        recipe = recipes[i % len(recipes)]
+        records.append(
+            {
+                "text": f"#{i} {recipe['text']}",
+                "metadata": {
+                    **recipe["metadata"],
+                    "title": f"{recipe['metadata']['title']} {i}",
+                },
+            }
+        )
+    with open(json_path, "w") as json_file:
+        json.dump(records, json_file)
+    with open(jsonl_path, "w") as jsonl_file:
+        for record in records:
+            jsonl_file.write(json.dumps(record) + "\n")
+    return directory
+
+
+def run_baseline(directory: str) -> None:
+    Settings.embed_model = SlowMockEmbedding(
+        embed_dim=DIMENSIONS, embed_batch_size=BATCH_SIZE
+    )
+    started = time.perf_counter()
+    with open(os.path.join(directory, "corpus.json"), "r") as json_file:
+        documents = [Document(**i) for i in json.load(json_file)]
+    VectorStoreIndex.from_documents(documents)
+    elapsed = time.perf_counter() - started
+    print(
+        f"  load_or_build_index: {len(documents) / elapsed:.0f} docs/s, "
+        f"peak RSS {peak_rss_mb():.0f} MB"
+    )
+
+
+def run_streaming(directory: str, interrupt_after: float = 0) -> None:
+    ingestor = StreamingIngestor(
+        SlowMockEmbedding(embed_dim=DIMENSIONS, embed_batch_size=BATCH_SIZE),
+        os.path.join(directory, "store"),
+        batch_size=BATCH_SIZE,
+        max_concurrency=8,
+        requests_per_minute=60_000,
+        tokens_per_minute=100_000_000,
+    )
+
+    async def ingest():
+        task = asyncio.ensure_future(
+            ingestor.ingest(os.path.join(directory, "corpus.jsonl"))
+        )
+        if interrupt_after:
+            await asyncio.sleep(interrupt_after)
+            task.cancel()
+        return await task
+
+    try:
+        stats = asyncio.run(ingest())
+    except asyncio.CancelledError:
+        with open(os.path.join(directory, "store", "checkpoint.json")) as checkpoint:
+            print(f"  interrupted after {json.load(checkpoint)['documents']} documents")
+        return
+    print(
+        f"  streaming (resumed): {stats['documents_per_second']:.0f} docs/s for the "
+        f"remaining {stats['documents']} of {stats['total_documents']}, "
+        f"peak RSS {peak_rss_mb():.0f} MB"
+    )
+
+
+def spawn(mode: str, directory: str, *args: str) -> None:
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.streaming_ingestion",
+            mode,
+            directory,
+            *args,
+        ],
+        check=True,
+    )
+
+
+def main():
+    if len(sys.argv) > 2:
+        mode, directory = sys.argv[1], sys.argv[2]
+        if mode == "baseline":
+            run_baseline(directory)
+        else:
+            run_streaming(directory, float(sys.argv[3]) if len(sys.argv) > 3 else 0)
+        return
+
+    n_documents = int(sys.argv[1]) if len(sys.argv) > 1 else N_DOCUMENTS
+    with tempfile.TemporaryDirectory() as directory:
+        write_corpus(directory, n_documents)
+        print(f"{n_documents} documents, {DIMENSIONS}-d embeddings")
+        spawn("baseline", directory)
+        spawn("stream", directory, "1.0")
+        spawn("stream", directory)
+
+
+if __name__ == "__main__":
+    main()
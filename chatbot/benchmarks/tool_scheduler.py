@@ -0,0 +1,91 @@
+"""Multi-tool turn benchmark: sequential tool execution vs ToolScheduler.
+
+Simulates a single agent step in which gpt-4o requests three
+`sustainability_qa` lookups (a QueryEngineTool over an async query engine, as
+in app.py) and one `recipe_finder` call (a blocking FunctionTool). The QA
+lookups are awaited on the event loop and the finder runs on the thread pool;
+the benchmark checks that no QA lookup ran off the loop. Run from the chatbot
+directory:
+
+    python -m benchmarks.tool_scheduler
+"""
+
+import asyncio
+import threading
+import time
+from typing import List
+
+from llama_index.core.query_engine import CustomQueryEngine
+from llama_index.core.tools import FunctionTool, QueryEngineTool
+from llama_index.core.tools.types import adapt_to_async_tool
+from utils.tool_scheduler import ToolScheduler
+
+QA_LATENCY = 0.4
+FINDER_LATENCY = 0.25
+ROUNDS = 5
+
+
+class SustainabilityQueryEngine(CustomQueryEngine):
+    """Stand-in for the retrieval + synthesis query engine."""
+
+    threads: set = set()
+
+    def custom_query(self, query_str: str) -> str:
+        time.sleep(QA_LATENCY)
+        return f"{query_str}: 0.35 kg CO2e/kg"
+
+    async def acustom_query(self, query_str: str) -> str:
+        self.threads.add(threading.get_ident())
+        await asyncio.sleep(QA_LATENCY)
+        return f"{query_str}: 0.35 kg CO2e/kg"
+
+
+def recipe_finder(ingredients: List[str]) -> List[dict]:
+    """Stand-in for the blocking recipe scan."""
+    time.sleep(FINDER_LATENCY)
+    return [{"title": "Seasonal Potato Salad", "matching_ingredients": ingredients}]
+
+
+QA_ENGINE = SustainabilityQueryEngine()
+QA_TOOL = QueryEngineTool.from_defaults(QA_ENGINE, name="sustainability_qa")
+FINDER_TOOL = FunctionTool.from_defaults(fn=recipe_finder, name="recipe_finder")
+CALLS = [
+    (QA_TOOL, {"input": "Tomatoes"}),
+    (QA_TOOL, {"input": "Beef"}),
+    (QA_TOOL, {"input": "Lentils"}),
+    (FINDER_TOOL, {"ingredients": ["New Potatoes", "Dill"]}),
+]
+
+
+async def run_sequential() -> float:
+    start = time.perf_counter()
+    for tool, kwargs in CALLS:
+        await adapt_to_async_tool(tool).acall(**kwargs)
+    return time.perf_counter() - start
+
+
+async def run_scheduled(scheduler: ToolScheduler) -> float:
+    start = time.perf_counter()
+    outputs = await scheduler.gather(CALLS)
+    elapsed = time.perf_counter() - start
+    assert [o.tool_name for o in outputs] == [t.metadata.name for t, _ in CALLS]
+    return elapsed
+
+
+async def main():
+    scheduler = ToolScheduler(max_workers=4, timeout=10.0)
+    sequential = [await run_sequential() for _ in range(ROUNDS)]
+    scheduled = [await run_scheduled(scheduler) for _ in range(ROUNDS)]
+    scheduler.shutdown()
+
+    assert QA_ENGINE.threads == {threading.get_ident()}, "QA ran off the event loop"
+
+    seq, par = min(sequential), min(scheduled)
+    print(f"tool calls per turn: {len(CALLS)}")
+    print(f"sequential: {seq * 1000:.1f} ms")
+    print(f"scheduled:  {par * 1000:.1f} ms")
+    print(f"speedup:    {seq / par:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
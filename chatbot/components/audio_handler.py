@@ -2,19 +2,19 @@ import os
 from typing import Optional
 
 import chainlit as cl
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 
 class AudioHandler:
-    def __init__(self):
-        """Initialize the AudioHandler with OpenAI client."""
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    def __init__(self, client: Optional[AsyncOpenAI] = None):
+        """Initialize the AudioHandler with a shared async OpenAI client."""
+        self.client = client or AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
     async def process_audio(self, audio_file) -> Optional[str]:
         """Process audio file and return transcribed text."""
         try:
             # Transcribe audio using Whisper API
-            transcript = self.client.audio.transcriptions.create(
+            transcript = await self.client.audio.transcriptions.create(
                 model="whisper-1", file=audio_file, language="de"
             )
 
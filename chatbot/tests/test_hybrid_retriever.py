@@ -0,0 +1,96 @@
+"""Metadata prefilter and hybrid retrieval over the shipped recipe dataset.
+
+Run from the chatbot directory:
+
+    python -m pytest tests
+"""
+
+import json
+
+import pytest
+from llama_index.core import VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import TextNode
+from utils.hybrid_retriever import HybridRetriever, MetadataPrefilter
+from utils.meal_plan_optimizer import name_words
+
+
+@pytest.fixture(scope="module")
+def nodes():
+    with open("datasets/recipes.json", "r") as recipes_file:
+        return [
+            TextNode(text=recipe["text"], metadata=recipe["metadata"])
+            for recipe in json.load(recipes_file)
+        ]
+
+
+@pytest.fixture(scope="module")
+def prefilter(nodes):
+    return MetadataPrefilter(nodes)
+
+
+def ingredient_words(node):
+    return {
+        word
+        for ingredient in node.metadata["ingredients"]
+        for word in name_words(ingredient["name"])
+    }
+
+
+def allowed_nodes(prefilter, nodes, query):
+    allowed = prefilter.allowed_ids(query)
+    assert allowed is not None
+    return [node for node in nodes if node.node_id in allowed]
+
+
+@pytest.mark.parametrize(
+    "query, excluded",
+    [
+        ("vegan dinner without onions", {"onion"}),
+        ("I am allergic to walnuts, suggest a dessert", {"walnut"}),
+        ("Ich bin allergisch gegen walnuts, ein Dessert bitte", {"walnut"}),
+        ("a dessert, no walnuts please", {"walnut"}),
+        ("something with rice but no cheese", {"cheese"}),
+        ("curry with rice instead of pasta", {"pasta"}),
+        ("ohne onions, etwas vegan", {"onion"}),
+        ("nut-free dessert", {"walnut"}),
+        ("dinner without onions or garlic", {"onion", "garlic"}),
+    ],
+)
+def test_negated_ingredients_are_excluded(prefilter, nodes, query, excluded):
+    allowed = allowed_nodes(prefilter, nodes, query)
+    assert allowed
+    for node in allowed:
+        assert not ingredient_words(node) & excluded, node.metadata["title"]
+
+
+def test_negated_ingredients_are_not_requested(prefilter):
+    constraints = prefilter.constraints("vegan dinner without onions")
+    assert "ingredients" not in constraints
+    constraints = prefilter.constraints("curry with rice instead of pasta")
+    assert {"rice"} <= constraints["ingredients"]
+    assert "pasta" not in constraints["ingredients"]
+
+
+def test_requested_ingredients_still_narrow_the_candidates(prefilter, nodes):
+    for node in allowed_nodes(prefilter, nodes, "a dessert with walnuts"):
+        assert "walnut" in ingredient_words(node)
+
+
+def test_exclusions_survive_relaxing_the_other_constraints(prefilter, nodes):
+    # Every dessert has walnuts, so only the exclusion can be kept
+    allowed = allowed_nodes(prefilter, nodes, "nut-free dessert")
+    assert allowed and all("walnut" not in ingredient_words(n) for n in allowed)
+
+
+def test_hybrid_retrieval_never_returns_excluded_ingredients(nodes):
+    index = VectorStoreIndex(nodes, embed_model=MockEmbedding(embed_dim=8))
+    retriever = HybridRetriever(index, similarity_top_k=5)
+    for query, excluded in [
+        ("vegan dinner without onions", "onion"),
+        ("I am allergic to walnuts, suggest a dessert", "walnut"),
+    ]:
+        results = retriever.retrieve(query)
+        assert results
+        for result in results:
+            assert excluded not in ingredient_words(result.node)
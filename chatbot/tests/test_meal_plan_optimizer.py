@@ -0,0 +1,54 @@
+"""Meal plan optimizer ingredient matching.
+
+Run from the chatbot directory:
+
+    python -m pytest tests
+"""
+
+from utils.meal_plan_optimizer import MealPlanOptimizer
+
+
+def fridge_item(name, amount="0.5kg"):
+    return {"name": name, "amount": amount, "risk_percentage": 10, "co2_impact": 1.0}
+
+
+def recipe(title, *names):
+    return {"title": title, "ingredients": [{"name": name} for name in names]}
+
+
+def plan_entry(recipes, fridge, title):
+    plan = MealPlanOptimizer(recipes).optimize(fridge, n_recipes=len(recipes))
+    return next(entry for entry in plan["recipes"] if entry["title"] == title)
+
+
+def matched_names(entry):
+    ingredients = entry["recipe"]["ingredients"]
+    return [ingredients[i]["name"] for i in entry["matched_ingredients"]]
+
+
+def test_plural_fridge_items_match_singular_ingredients():
+    recipes = [recipe("Smoothie", "Banana", "Spinach", "Plant Milk")]
+    entry = plan_entry(recipes, [fridge_item("bananas")], "Smoothie")
+    assert entry["uses"] == ["bananas"]
+    assert matched_names(entry) == ["Banana"]
+
+
+def test_substitutes_are_neither_used_nor_matched():
+    recipes = [
+        recipe("Lasagna", "Plant-based Cheese", "Coconut Milk", "Pasta"),
+        recipe("Gratin", "Cheese", "Milk", "Potatoes"),
+    ]
+    fridge = [fridge_item("cheese"), fridge_item("milk")]
+    plan = MealPlanOptimizer(recipes).optimize(fridge, n_recipes=2)
+    assert [entry["title"] for entry in plan["recipes"]] == ["Gratin"]
+    assert matched_names(plan["recipes"][0]) == ["Cheese", "Milk"]
+
+
+def test_cuts_and_forms_match_but_other_products_do_not():
+    recipes = [
+        recipe("Salad", "Chicken Breast", "Lemon Juice", "Tomato Sauce"),
+    ]
+    fridge = [fridge_item("chicken"), fridge_item("lemon"), fridge_item("tomato")]
+    entry = plan_entry(recipes, fridge, "Salad")
+    assert sorted(entry["uses"]) == ["chicken", "lemon"]
+    assert matched_names(entry) == ["Chicken Breast", "Lemon Juice"]
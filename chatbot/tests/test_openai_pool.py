@@ -0,0 +1,192 @@
+"""OpenAIClientPool against the local stand-in server from benchmarks/openai_pool.py.
+
+Run from the chatbot directory:
+
+    python -m pytest tests
+"""
+
+import asyncio
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+from benchmarks.openai_pool import StandInServer
+from utils import openai_pool as openai_pool_module
+from utils.openai_pool import OpenAIClientPool, background_priority, retry_delay
+
+CHAT_MODEL = "gpt-4o"
+EMBED_MODEL = "text-embedding-3-large"
+UNLIMITED = (60_000, 100_000_000)
+
+
+@pytest.fixture
+def server():
+    server = StandInServer(requests_per_second=1000, error_rate=0.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_pool(server, **kwargs):
+    kwargs.setdefault("model_limits", {CHAT_MODEL: UNLIMITED, EMBED_MODEL: UNLIMITED})
+    return OpenAIClientPool(api_key="test", base_url=server.base_url, **kwargs)
+
+
+def chat(client, text="hi"):
+    return client.chat.completions.create(
+        model=CHAT_MODEL, messages=[{"role": "user", "content": text}], max_tokens=16
+    )
+
+
+async def achat(client, text="hi"):
+    return await client.chat.completions.create(
+        model=CHAT_MODEL, messages=[{"role": "user", "content": text}], max_tokens=16
+    )
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Record the retry delays the transports ask for and shorten them to 10 ms."""
+    recorded = []
+
+    def fake_retry_delay(attempt, headers=None):
+        recorded.append((attempt, retry_delay(attempt, headers, base=0.0)))
+        return 0.01
+
+    monkeypatch.setattr(openai_pool_module, "retry_delay", fake_retry_delay)
+    return recorded
+
+
+def test_retry_delay_honours_retry_after_and_caps_jitter():
+    for attempt in range(8):
+        delay = retry_delay(attempt, base=0.5, maximum=4.0)
+        assert 0 <= delay <= min(4.0, 0.5 * 2**attempt)
+    assert retry_delay(0, httpx.Headers({"retry-after-ms": "250"})) >= 0.25
+    assert retry_delay(0, httpx.Headers({"retry-after": "2"})) >= 2.0
+
+
+def test_429_waits_for_retry_after_and_blocks_the_model(server):
+    pool = make_pool(server)
+    server.script = [429, 429]
+    started = time.monotonic()
+    response = chat(pool.client)
+    elapsed = time.monotonic() - started
+
+    assert response.choices[0].message.content == "Sure!"
+    assert len(server.requests) == 3
+    # Each 429 carries retry-after-ms: 100
+    assert elapsed >= 0.2
+    stats = pool.stats()["interactive"]
+    assert stats["rate_limited"] == 2 and stats["retries"] == 2
+    assert pool.limiter._buckets[CHAT_MODEL].blocked_until > 0
+    pool.close()
+
+
+def test_5xx_backs_off_exponentially_without_blocking_the_model(server, delays):
+    pool = make_pool(server)
+    server.script = [503, 500, 502]
+    chat(pool.client)
+
+    assert [attempt for attempt, _ in delays] == [0, 1, 2]
+    assert pool.stats()["interactive"]["server_errors"] == 3
+    assert pool.limiter._buckets[CHAT_MODEL].blocked_until == 0.0
+    pool.close()
+
+
+def test_5xx_gives_up_after_max_retries(server, delays):
+    pool = make_pool(server, max_retries=2)
+    server.script = [503] * 5
+    with pytest.raises(openai.InternalServerError):
+        chat(pool.client)
+    assert len(server.requests) == 3
+    assert pool.limiter.in_flight == 0
+    pool.close()
+
+
+def test_background_work_yields_to_interactive_calls(server):
+    # One request per second per model, so every call after the first queues
+    pool = make_pool(
+        server, model_limits={EMBED_MODEL: (60, 100_000_000)}, burst_seconds=1.0
+    )
+
+    def background_build():
+        with background_priority():
+            for i in range(3):
+                pool.client.embeddings.create(
+                    model=EMBED_MODEL, input=f"background {i}"
+                )
+
+    build = threading.Thread(target=background_build)
+    build.start()
+    # Let the first background call through and the second one start waiting
+    time.sleep(0.3)
+    started = time.monotonic()
+    pool.client.embeddings.create(model=EMBED_MODEL, input="interactive")
+    interactive_seconds = time.monotonic() - started
+    build.join()
+
+    order = [request["input"] for _, request in server.requests]
+    assert order == ["background 0", "interactive", "background 1", "background 2"]
+    assert interactive_seconds < 1.5
+    pool.close()
+
+
+def test_sync_calls_release_their_slots(server, delays):
+    pool = make_pool(server, max_retries=1)
+    for _ in range(3):
+        chat(pool.client)
+    pool.client.embeddings.create(model=EMBED_MODEL, input=["a", "b"])
+    server.script = [503]
+    chat(pool.client)
+    server.script = [503, 503]
+    with pytest.raises(openai.InternalServerError):
+        chat(pool.client)
+    with pool.client.chat.completions.with_streaming_response.create(
+        model=CHAT_MODEL, messages=[{"role": "user", "content": "hi"}]
+    ) as response:
+        response.read()
+
+    assert pool.limiter.in_flight == 0
+    assert pool.stats()["interactive"]["requests"] == len(server.requests)
+    pool.close()
+
+
+def test_async_calls_release_their_slots(server, delays):
+    pool = make_pool(server, max_retries=1)
+
+    async def run():
+        await asyncio.gather(*(achat(pool.async_client, str(i)) for i in range(10)))
+        server.script = [503]
+        await achat(pool.async_client)
+        server.script = [503, 503]
+        with pytest.raises(openai.InternalServerError):
+            await achat(pool.async_client)
+        # A caller cancelled mid-request gives its slot back too
+        task = asyncio.ensure_future(achat(pool.async_client))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await pool.aclose()
+
+    asyncio.run(run())
+    assert pool.limiter.in_flight == 0
+
+
+def test_limits_follow_rate_limit_headers(server):
+    server.headers = {
+        "x-ratelimit-limit-requests": "10000",
+        "x-ratelimit-limit-tokens": "2000000",
+        "x-ratelimit-remaining-requests": "9999",
+        "x-ratelimit-remaining-tokens": "1500",
+    }
+    pool = make_pool(server, model_limits={})
+    chat(pool.client)
+
+    bucket = pool.limiter._buckets[CHAT_MODEL]
+    assert bucket.limits == (10_000, 2_000_000)
+    assert bucket.available["tokens"] <= 1500
+    pool.close()
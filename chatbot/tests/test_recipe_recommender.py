@@ -0,0 +1,54 @@
+"""Recipe recommender swipe handling.
+
+Run from the chatbot directory:
+
+    python -m pytest tests
+"""
+
+import threading
+
+import numpy as np
+from utils.recipe_recommender import RecipeRecommender
+
+N_RECIPES = 2000
+
+
+def make_recommender():
+    embeddings = np.random.default_rng(0).normal(size=(N_RECIPES, 64))
+    return RecipeRecommender(
+        [f"recipe-{i}" for i in range(N_RECIPES)],
+        embeddings.astype(np.float32),
+        [{"title": f"Recipe {i}"} for i in range(N_RECIPES)],
+    )
+
+
+def test_swiped_recipes_are_not_recommended():
+    recommender = make_recommender()
+    first = recommender.recommend("user", k=5)
+    for position in first:
+        recommender.record_feedback(
+            "user", recommender.recipe_ids[position], True, persist=False
+        )
+    assert not set(first) & set(recommender.recommend("user", k=5))
+
+
+def test_recommending_while_the_user_swipes():
+    recommender = make_recommender()
+    done = threading.Event()
+
+    def swipe():
+        i = 0
+        while not done.is_set():
+            recipe_id = f"recipe-{i % N_RECIPES}"
+            recommender.record_feedback("user", recipe_id, i % 2 == 0, persist=False)
+            i += 1
+
+    swiper = threading.Thread(target=swipe)
+    swiper.start()
+    try:
+        for _ in range(2000):
+            recommender.recommend("user", k=5)
+    finally:
+        done.set()
+        swiper.join()
+    assert recommender.users.seen_for("user")
@@ -0,0 +1,78 @@
+"""Streaming ingestion through the shared OpenAI client pool.
+
+Run from the chatbot directory:
+
+    python -m pytest tests
+"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+from benchmarks.openai_pool import StandInServer
+from llama_index.core import Settings
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.embeddings.openai import OpenAIEmbedding
+from utils.openai_pool import OpenAIClientPool
+from utils.streaming_ingestion import ingest_jsonl_index
+
+EMBED_MODEL = "text-embedding-3-large"
+DOCUMENTS = 64
+
+
+@pytest.fixture
+def server():
+    server = StandInServer(requests_per_second=1000, error_rate=0.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "recipes.jsonl"
+    with open(path, "w") as corpus_file:
+        for i in range(DOCUMENTS):
+            record = {"text": f"recipe {i}", "metadata": {"title": f"Recipe {i}"}}
+            corpus_file.write(json.dumps(record) + "\n")
+    return str(path)
+
+
+def test_startup_ingestion_leaves_the_shared_async_client_usable(
+    server, corpus, tmp_path, monkeypatch
+):
+    # The loaded index only needs an embed model to exist, it is not queried
+    monkeypatch.setattr(Settings, "_embed_model", MockEmbedding(embed_dim=8))
+    pool = OpenAIClientPool(api_key="test", base_url=server.base_url)
+    async_http_client = pool.new_async_http_client()
+    embed_model = OpenAIEmbedding(
+        model=EMBED_MODEL,
+        embed_batch_size=8,
+        **pool.llama_index_kwargs(async_http_client),
+    )
+    index = ingest_jsonl_index(
+        corpus,
+        str(tmp_path / "store"),
+        embed_model,
+        async_http_client=async_http_client,
+        max_concurrency=4,
+        requests_per_minute=None,
+    )
+    assert len(index.index_struct.nodes_dict) == DOCUMENTS
+
+    # The first calls of the app run in a new event loop on the shared client
+    async def first_calls():
+        embeddings = await asyncio.gather(
+            *(
+                pool.async_client.embeddings.create(model=EMBED_MODEL, input=str(i))
+                for i in range(4)
+            )
+        )
+        await pool.aclose()
+        return embeddings
+
+    assert len(asyncio.run(first_calls())) == 4
+    assert pool.limiter.in_flight == 0
+    pool.close()
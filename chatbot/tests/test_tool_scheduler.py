@@ -0,0 +1,48 @@
+"""ToolScheduler dispatch of sync and async tools.
+
+Run from the chatbot directory:
+
+    python -m pytest tests
+"""
+
+import asyncio
+import threading
+
+from llama_index.core.tools import FunctionTool
+from utils.tool_scheduler import ToolScheduler, has_native_async
+
+
+async def async_lookup(input: str) -> int:
+    """Async tool."""
+    await asyncio.sleep(0.05)
+    return threading.get_ident()
+
+
+def blocking_lookup(input: str) -> int:
+    """Sync tool."""
+    return threading.get_ident()
+
+
+def test_native_async_function_tools_are_detected():
+    assert has_native_async(FunctionTool.from_defaults(async_fn=async_lookup))
+    assert has_native_async(
+        FunctionTool.from_defaults(fn=blocking_lookup, async_fn=async_lookup)
+    )
+    assert not has_native_async(FunctionTool.from_defaults(fn=blocking_lookup))
+
+
+def test_async_tools_run_on_the_loop_and_sync_tools_on_the_pool():
+    scheduler = ToolScheduler(max_workers=2, timeout=5.0)
+    async_tool = FunctionTool.from_defaults(async_fn=async_lookup)
+    sync_tool = FunctionTool.from_defaults(fn=blocking_lookup)
+
+    async def run():
+        outputs = await scheduler.gather(
+            [(async_tool, {"input": "a"}), (sync_tool, {"input": "b"})]
+        )
+        return threading.get_ident(), [output.raw_output for output in outputs]
+
+    loop_thread, (async_thread, sync_thread) = asyncio.run(run())
+    scheduler.shutdown()
+    assert async_thread == loop_thread
+    assert sync_thread != loop_thread
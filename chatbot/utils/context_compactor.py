@@ -0,0 +1,164 @@
+import re
+from typing import Any, Callable, List, Optional, Tuple
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.utils import get_tokenizer
+
+# Metadata each query engine tool actually needs in its synthesis context
+RECIPE_CONTEXT_KEYS = [
+    "title",
+    "ingredients",
+    "tags",
+    "preparation_time",
+    "difficulty",
+    "sustainability_score",
+]
+SUSTAINABILITY_CONTEXT_KEYS = ["ingredient", "seasonal_months", "alternatives"]
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 600
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def compact_metadata_value(key: str, value: Any) -> Any:
+    """Shrink a metadata value to what the LLM needs to reason about it."""
+    if key == "ingredients" and isinstance(value, list):
+        # Amounts and units are not needed to answer questions about a recipe
+        return ", ".join(
+            ing["name"] if isinstance(ing, dict) else str(ing) for ing in value
+        )
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    return value
+
+
+def normalize_sentence(sentence: str) -> str:
+    return " ".join(sentence.lower().split()).rstrip(".!?")
+
+
+class ContextCompactor(BaseNodePostprocessor):
+    """Shrinks retrieved nodes before they are packed into the synthesis prompt.
+
+    Keeps only the configured metadata keys (in compact form), drops sentences
+    that already appeared in a higher-ranked node and stops adding context once
+    the per-query token budget is spent. Retrieved nodes are copied, so the
+    nodes in the docstore are left untouched.
+    """
+
+    metadata_keys: List[str] = Field(
+        default_factory=list, description="Metadata keys to keep in the context."
+    )
+    token_budget: int = Field(
+        default=DEFAULT_CONTEXT_TOKEN_BUDGET,
+        description="Maximum number of context tokens per query.",
+    )
+    _tokenizer: Callable[[str], List] = PrivateAttr()
+
+    def __init__(
+        self,
+        metadata_keys: List[str],
+        token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+        tokenizer: Optional[Callable[[str], List]] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(
+            metadata_keys=metadata_keys, token_budget=token_budget, **kwargs
+        )
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextCompactor"
+
+    def _count_tokens(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def _compact_node(self, node: TextNode, sentences: List[str]) -> TextNode:
+        metadata = {
+            key: compact_metadata_value(key, node.metadata[key])
+            for key in self.metadata_keys
+            if key in node.metadata
+        }
+        return TextNode(
+            id_=node.node_id,
+            text=" ".join(sentences),
+            metadata=metadata,
+            metadata_separator=node.metadata_separator,
+        )
+
+    def _node_tokens(self, node: TextNode) -> int:
+        return self._count_tokens(node.get_content(metadata_mode=MetadataMode.LLM))
+
+    def _truncate_node(
+        self, node: TextNode, sentences: List[str], budget: int
+    ) -> Tuple[Optional[TextNode], List[str]]:
+        """Cut a node to the longest word prefix that fits the budget.
+
+        Returns the truncated node (None if not even its metadata fits) and
+        the sentences that were emitted in full.
+        """
+        words = " ".join(sentences).split()
+        low, high = -1, len(words)
+        # Binary search for the largest number of words that still fits
+        while low < high:
+            middle = (low + high + 1) // 2
+            text = " ".join(words[:middle])
+            if self._node_tokens(self._compact_node(node, [text])) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        if low < 0:
+            return None, []
+
+        emitted, used = [], 0
+        for sentence in sentences:
+            used += len(sentence.split())
+            if used > low:
+                break
+            emitted.append(sentence)
+        return self._compact_node(node, [" ".join(words[:low])]), emitted
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        seen_sentences = set()
+        remaining = self.token_budget
+        compacted: List[NodeWithScore] = []
+
+        for result in nodes:
+            node = result.node
+            text = node.get_content(metadata_mode=MetadataMode.NONE)
+            sentences = []
+            for sentence in SENTENCE_PATTERN.split(text.strip()):
+                key = normalize_sentence(sentence)
+                if key and key not in seen_sentences:
+                    sentences.append(sentence)
+            if not sentences:
+                continue
+
+            # Trim trailing sentences of the node that crosses the budget
+            compact_node = self._compact_node(node, sentences)
+            while self._node_tokens(compact_node) > remaining and len(sentences) > 1:
+                sentences.pop()
+                compact_node = self._compact_node(node, sentences)
+
+            if self._node_tokens(compact_node) > remaining:
+                if compacted:
+                    break
+                # The best-ranked node is cut to the budget rather than dropped
+                compact_node, sentences = self._truncate_node(
+                    node, sentences, remaining
+                )
+                if compact_node is None:
+                    continue
+
+            # Only sentences actually sent to the LLM count as seen
+            seen_sentences.update(normalize_sentence(s) for s in sentences)
+            remaining -= self._node_tokens(compact_node)
+            compacted.append(NodeWithScore(node=compact_node, score=result.score))
+
+        return compacted
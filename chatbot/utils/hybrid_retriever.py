@@ -0,0 +1,380 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from llama_index.core import QueryBundle, VectorStoreIndex
+from llama_index.core.retrievers import BaseRetriever, VectorIndexRetriever
+from llama_index.core.schema import BaseNode, NodeWithScore
+from utils.meal_plan_optimizer import name_words
+
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [
+            ("january", "jan", "januar"),
+            ("february", "feb", "februar"),
+            ("march", "mar", "märz"),
+            ("april", "apr"),
+            ("may", "mai"),
+            ("june", "jun", "juni"),
+            ("july", "jul", "juli"),
+            ("august", "aug"),
+            ("september", "sep", "sept"),
+            ("october", "oct", "oktober"),
+            ("november", "nov"),
+            ("december", "dec", "dezember"),
+        ],
+        start=1,
+    )
+    for name in names
+}
+# Month names that are also common words ("What may I use ...") only count
+# as a month after a preposition such as "in May" or "im Mai"
+AMBIGUOUS_MONTHS = {"may", "mai"}
+MONTH_CONTEXT_PATTERN = re.compile(
+    r"\b(?:in|im|during|of|from|until|since|ab|bis|seit|während|anfang|ende|mitte)"
+    r"\s+(?:early\s+|late\s+|mid\s+)?(may|mai)\b",
+    re.IGNORECASE,
+)
+
+# Query words that map to recipe tags; a tag is satisfied by any of its values
+TAG_ALIASES = {
+    "vegetarian": {"vegetarian", "vegan", "vegan-option"},
+    "vegetarisch": {"vegetarian", "vegan", "vegan-option"},
+    "vegan": {"vegan"},
+    "gluten-free": {"gluten-free"},
+    "glutenfrei": {"gluten-free"},
+    "breakfast": {"breakfast"},
+    "frühstück": {"breakfast"},
+    "dessert": {"dessert", "healthy-dessert"},
+    "soup": {"soup"},
+    "suppe": {"soup"},
+}
+
+MAX_TIME_PATTERN = re.compile(
+    r"(?:under|less than|within|max(?:imum)?|at most|unter|höchstens)\s+(\d+)\s*(?:min|minutes|minuten)",
+    re.IGNORECASE,
+)
+# Phrases that negate the ingredients after them, up to the end of the clause
+# ("without onions or garlic", "allergic to walnuts, suggest a dessert")
+NEGATION_PATTERN = re.compile(
+    r"\b(?:without|no|not|avoid(?:ing)?|allerg(?:ic|y) to|intolerant to"
+    r"|instead of|ohne|kein(?:e|en|er|em)?|statt|anstatt|allergisch gegen)\s+",
+    re.IGNORECASE,
+)
+NEGATION_END_PATTERN = re.compile(
+    r"[.;:!?]|\b(?:with|but|please|suggest|recommend|give|show|find|for|that"
+    r"|which|what|i|mit|aber|bitte|für|ich)\b",
+    re.IGNORECASE,
+)
+# "nut-free", "dairy free", "laktosefrei"
+FREE_PATTERN = re.compile(r"\b([a-zäöüß]+)(?:-| )?(?:free|frei)\b", re.IGNORECASE)
+# Negated group words that stand for the ingredients they cover
+EXCLUSION_ALIASES = {
+    "nut": {
+        "almond",
+        "cashew",
+        "hazelnut",
+        "nut",
+        "peanut",
+        "pecan",
+        "pistachio",
+        "walnut",
+    },
+    "nuss": {
+        "almond",
+        "cashew",
+        "hazelnut",
+        "nut",
+        "peanut",
+        "pecan",
+        "pistachio",
+        "walnut",
+    },
+    "dairy": {"butter", "cheese", "cream", "milk", "yogurt", "yoghurt"},
+    "lactose": {"butter", "cheese", "cream", "milk", "yogurt", "yoghurt"},
+    "laktose": {"butter", "cheese", "cream", "milk", "yogurt", "yoghurt"},
+}
+TOKEN_PATTERN = re.compile(r"[a-zäöüß0-9]+(?:-[a-zäöüß0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokenizer shared by the BM25 index and the prefilter."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def node_ingredients(node: BaseNode) -> Set[str]:
+    """Normalized ingredient names of a recipe or sustainability node."""
+    metadata = node.metadata
+    names = {
+        ing["name"].lower().strip()
+        for ing in metadata.get("ingredients", [])
+        if isinstance(ing, dict) and ing.get("name")
+    }
+    if metadata.get("ingredient"):
+        names.add(metadata["ingredient"].lower().strip())
+    return names
+
+
+def negated_spans(query: str) -> List[Tuple[int, int]]:
+    """Character spans of a query whose ingredients are excluded, not requested."""
+    spans = []
+    for match in NEGATION_PATTERN.finditer(query):
+        end = NEGATION_END_PATTERN.search(query, match.end())
+        spans.append((match.start(), end.start() if end else len(query)))
+    spans.extend(match.span() for match in FREE_PATTERN.finditer(query))
+    return spans
+
+
+def parse_minutes(value: Any) -> Optional[int]:
+    """Parse a preparation time such as '20 minutes' into minutes."""
+    match = re.match(r"\s*(\d+)", str(value or ""))
+    return int(match.group(1)) if match else None
+
+
+class BM25Index:
+    """Minimal in-memory Okapi BM25 index over node text."""
+
+    def __init__(self, nodes: List[BaseNode], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.node_ids = [node.node_id for node in nodes]
+        self.term_freqs = [Counter(tokenize(node.get_content())) for node in nodes]
+        self.doc_lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = sum(self.doc_lengths) / max(len(nodes), 1)
+
+        doc_freqs = Counter(term for tf in self.term_freqs for term in tf)
+        n_docs = len(nodes)
+        self.idf = {
+            term: math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def score(
+        self, query: str, allowed_ids: Optional[Set[str]] = None
+    ) -> Dict[str, float]:
+        """BM25 scores of all (allowed) nodes with a positive score."""
+        terms = [term for term in tokenize(query) if term in self.idf]
+        scores = {}
+        for node_id, tf, length in zip(
+            self.node_ids, self.term_freqs, self.doc_lengths
+        ):
+            if allowed_ids is not None and node_id not in allowed_ids:
+                continue
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term, 0)
+                if freq:
+                    norm = self.k1 * (1 - self.b + self.b * length / self.avg_length)
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            if score > 0:
+                scores[node_id] = score
+        return scores
+
+
+class MetadataPrefilter:
+    """Derives structured constraints from a query and applies them to node metadata.
+
+    Supported constraints are seasonal months (`seasonal_months`), recipe tags
+    such as vegetarian, a maximum `preparation_time`, exact ingredient names
+    and excluded ingredients ("without onions", "allergic to walnuts"), which
+    drop every node with an ingredient containing the negated word. Constraints
+    only exclude nodes that carry the corresponding metadata field. An empty
+    result disables the prefilter for that query, except for the ingredient
+    exclusions, which always apply.
+    """
+
+    def __init__(self, nodes: List[BaseNode]):
+        self.nodes = nodes
+        self.ingredient_vocabulary = set().union(
+            *(node_ingredients(node) for node in nodes)
+        )
+        self.ingredient_words = {
+            word for name in self.ingredient_vocabulary for word in name_words(name)
+        }
+        # Only a word naming an ingredient is negated ("no fresh herbs" -> herb)
+        self.ingredient_heads = {
+            name_words(name)[-1]
+            for name in self.ingredient_vocabulary
+            if name_words(name)
+        }
+
+    def constraints(self, query: str) -> Dict[str, Any]:
+        """Extract the constraints mentioned in a query."""
+        query_lower = query.lower()
+        tokens = set(tokenize(query))
+        constraints: Dict[str, Any] = {}
+
+        months = {
+            MONTHS[token]
+            for token in tokens
+            if token in MONTHS and token not in AMBIGUOUS_MONTHS
+        }
+        months.update(
+            MONTHS[match.lower()] for match in MONTH_CONTEXT_PATTERN.findall(query)
+        )
+        if months:
+            constraints["months"] = months
+
+        tags = [TAG_ALIASES[token] for token in tokens if token in TAG_ALIASES]
+        if tags:
+            constraints["tags"] = tags
+
+        max_time = MAX_TIME_PATTERN.search(query)
+        if max_time:
+            constraints["max_minutes"] = int(max_time.group(1))
+
+        negated = negated_spans(query_lower)
+        excluded = set()
+        for start, end in negated:
+            for word in name_words(query_lower[start:end]):
+                if word in EXCLUSION_ALIASES:
+                    excluded.update(EXCLUSION_ALIASES[word] & self.ingredient_words)
+                elif word in self.ingredient_heads:
+                    excluded.add(word)
+        if excluded:
+            constraints["excluded_words"] = excluded
+
+        # Ingredients only mentioned in a negation are not requested
+        ingredients = {
+            name
+            for name in self.ingredient_vocabulary
+            if any(
+                not any(start <= match.start() < end for start, end in negated)
+                for match in re.finditer(rf"\b{re.escape(name)}\b", query_lower)
+            )
+        }
+        # Prefer the most specific name, e.g. "spring onions" over "onions"
+        ingredients = {
+            name
+            for name in ingredients
+            if not any(name != other and name in other for other in ingredients)
+        }
+        if ingredients:
+            constraints["ingredients"] = ingredients
+
+        return constraints
+
+    def matches(self, node: BaseNode, constraints: Dict[str, Any]) -> bool:
+        metadata = node.metadata
+        if "months" in constraints and "seasonal_months" in metadata:
+            if not constraints["months"] & set(metadata["seasonal_months"]):
+                return False
+        if "tags" in constraints and "tags" in metadata:
+            node_tags = set(metadata["tags"])
+            if not all(node_tags & accepted for accepted in constraints["tags"]):
+                return False
+        if "max_minutes" in constraints and "preparation_time" in metadata:
+            minutes = parse_minutes(metadata["preparation_time"])
+            if minutes is not None and minutes > constraints["max_minutes"]:
+                return False
+        if "ingredients" in constraints:
+            if not constraints["ingredients"] & node_ingredients(node):
+                return False
+        if "excluded_words" in constraints:
+            for name in node_ingredients(node):
+                if constraints["excluded_words"] & set(name_words(name)):
+                    return False
+        return True
+
+    def allowed_ids(self, query: str) -> Optional[Set[str]]:
+        """Node ids passing the prefilter, or None if nothing constrains the query."""
+        constraints = self.constraints(query)
+        if not constraints:
+            return None
+        allowed = {
+            node.node_id for node in self.nodes if self.matches(node, constraints)
+        }
+        if not allowed and "excluded_words" in constraints:
+            # Relax everything but the exclusions, which may be allergies
+            exclusions = {"excluded_words": constraints["excluded_words"]}
+            allowed = {
+                node.node_id for node in self.nodes if self.matches(node, exclusions)
+            }
+            return allowed
+        return allowed or None
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + vector retriever with metadata prefiltering and reciprocal rank fusion.
+
+    The metadata prefilter narrows the candidate set before either ranker runs,
+    so both the BM25 scan and the vector search only see matching nodes. The
+    two rankings are merged with reciprocal rank fusion and the top
+    `similarity_top_k` nodes are returned.
+    """
+
+    def __init__(
+        self,
+        index: VectorStoreIndex,
+        similarity_top_k: int = 3,
+        candidate_top_k: int = 10,
+        rrf_k: int = 60,
+        **kwargs: Any,
+    ):
+        """Initialize the retriever from an existing vector index."""
+        super().__init__(**kwargs)
+        self._index = index
+        self._similarity_top_k = similarity_top_k
+        self._candidate_top_k = candidate_top_k
+        self._rrf_k = rrf_k
+        self._nodes = {
+            node_id: node
+            for node_id, node in index.docstore.docs.items()
+            if node_id in index.index_struct.nodes_dict
+        }
+        self._bm25 = BM25Index(list(self._nodes.values()))
+        self._prefilter = MetadataPrefilter(list(self._nodes.values()))
+
+    def _vector_retriever(self, allowed_ids: Optional[Set[str]]) -> BaseRetriever:
+        return VectorIndexRetriever(
+            self._index,
+            similarity_top_k=self._candidate_top_k,
+            node_ids=list(allowed_ids) if allowed_ids is not None else None,
+        )
+
+    def _bm25_ranking(self, query: str, allowed_ids: Optional[Set[str]]) -> List[str]:
+        scores = self._bm25.score(query, allowed_ids)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return ranked[: self._candidate_top_k]
+
+    def _fuse(
+        self, bm25_ids: List[str], vector_results: List[NodeWithScore]
+    ) -> List[NodeWithScore]:
+        fused: Dict[str, float] = {}
+        for ranking in (bm25_ids, [result.node.node_id for result in vector_results]):
+            for rank, node_id in enumerate(ranking):
+                fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (
+                    self._rrf_k + rank + 1
+                )
+
+        vector_nodes = {result.node.node_id: result.node for result in vector_results}
+        ranked = sorted(fused, key=fused.get, reverse=True)[: self._similarity_top_k]
+        return [
+            NodeWithScore(
+                node=vector_nodes.get(node_id) or self._nodes[node_id],
+                score=fused[node_id],
+            )
+            for node_id in ranked
+        ]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        allowed_ids = self._prefilter.allowed_ids(query_bundle.query_str)
+        if allowed_ids is not None and not allowed_ids:
+            # An empty node_ids list would make the vector store search everything
+            return []
+        bm25_ids = self._bm25_ranking(query_bundle.query_str, allowed_ids)
+        vector_results = self._vector_retriever(allowed_ids).retrieve(query_bundle)
+        return self._fuse(bm25_ids, vector_results)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        allowed_ids = self._prefilter.allowed_ids(query_bundle.query_str)
+        if allowed_ids is not None and not allowed_ids:
+            # An empty node_ids list would make the vector store search everything
+            return []
+        bm25_ids = self._bm25_ranking(query_bundle.query_str, allowed_ids)
+        vector_results = await self._vector_retriever(allowed_ids).aretrieve(
+            query_bundle
+        )
+        return self._fuse(bm25_ids, vector_results)
@@ -0,0 +1,336 @@
+import re
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Grams or millilitres per unit; other units (pieces, bunch, tbsp) are treated
+# as using the whole fridge item
+UNIT_TO_BASE = {"g": 1, "kg": 1000, "ml": 1, "l": 1000}
+
+# Words that make an ingredient a substitute for, or a different food than,
+# the fridge item it contains ("Plant-based Cheese", "Coconut Milk",
+# "Sweet Potato"), unless the fridge item's own name has them
+SUBSTITUTE_MODIFIERS = {
+    "almond",
+    "based",
+    "cashew",
+    "coconut",
+    "dairy",
+    "free",
+    "imitation",
+    "lactose",
+    "meatless",
+    "mock",
+    "oat",
+    "plant",
+    "soy",
+    "sweet",
+    "vegan",
+    "veggie",
+}
+# Head nouns naming a cut or form of the fridge item ("Chicken Breast",
+# "Lemon Juice"); any other head noun names a different product
+# ("Tomato Sauce", "Pumpkin Seeds", "Garlic Powder")
+FORM_WORDS = {
+    "breast",
+    "chunk",
+    "fillet",
+    "juice",
+    "leg",
+    "mince",
+    "slice",
+    "thigh",
+    "wedge",
+    "wing",
+    "zest",
+}
+
+# Search budget in candidate evaluations, which bounds latency on large corpora
+DEFAULT_MAX_EVALUATIONS = 5_000_000
+# Best single recipes used to prune dominated candidates before the search
+DOMINANCE_ANCHORS = 64
+
+
+def normalize_word(word: str) -> str:
+    """Lowercase singular form, so "Bananas" matches "banana"."""
+    word = word.lower()
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("oes") and len(word) > 4:
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def name_words(name: str) -> Tuple[str, ...]:
+    return tuple(
+        normalize_word(word) for word in re.findall(r"[a-zäöüß]+", name.lower())
+    )
+
+
+def uses_item(item_words: frozenset, words: frozenset, head: str) -> bool:
+    """Whether a recipe ingredient (words, head noun) is the fridge item."""
+    if not item_words <= words or (words - item_words) & SUBSTITUTE_MODIFIERS:
+        return False
+    return head in item_words or head in FORM_WORDS
+
+
+def ingredient_uses_item(ingredient_name: str, item_words: frozenset) -> bool:
+    """Whether a recipe ingredient, given by name, is the fridge item."""
+    words = name_words(ingredient_name)
+    return bool(words) and uses_item(item_words, frozenset(words), words[-1])
+
+
+def parse_quantity(amount: Any, unit: str = "") -> Optional[float]:
+    """Convert an amount such as "0.30kg" or (500, "g") to grams/ml, if possible."""
+    match = re.match(r"\s*([\d.]+)\s*([a-zA-Z]*)", f"{amount}{unit}")
+    if not match:
+        return None
+    factor = UNIT_TO_BASE.get(match.group(2).lower())
+    return float(match.group(1)) * factor if factor else None
+
+
+class MealPlanOptimizer:
+    """Selects the set of recipes that rescues the most CO2 from the fridge.
+
+    Every recipe is represented by a row of a (recipes x fridge items) usage
+    matrix holding the fraction of each fridge item it uses up. A plan's value
+    is sum_i co2_i * urgency_i * min(1, usage_i), where urgency is the share
+    of shelf life already gone. The objective is monotone submodular, so
+    greedy selection is a (1 - 1/e) approximation; a branch-and-bound search
+    seeded with the greedy plan and pruned with a submodular upper bound then
+    improves on it within an evaluation budget. Recipes dominated by enough of the
+    best recipes are dropped up front, which keeps the search exact while
+    shrinking thousands of candidates to a few hundred.
+    """
+
+    def __init__(self, recipes: Sequence[Dict[str, Any]]):
+        """Index the recipe corpus by normalized ingredient words."""
+        self.recipes = list(recipes)
+        # word -> [(recipe position, ingredient words, head noun, g/ml or None)]
+        self._ingredient_index: Dict[str, List[Tuple[int, frozenset, str, Any]]]
+        self._ingredient_index = defaultdict(list)
+        for position, recipe in enumerate(self.recipes):
+            for ing in recipe.get("ingredients", []):
+                name = name_words(ing.get("name", ""))
+                if not name:
+                    continue
+                words = frozenset(name)
+                quantity = parse_quantity(ing.get("amount", ""), ing.get("unit", ""))
+                for word in words:
+                    self._ingredient_index[word].append(
+                        (position, words, name[-1], quantity)
+                    )
+
+    def usage_matrix(
+        self, fridge_items: Sequence[Dict[str, Any]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Candidate recipe positions and their fridge usage matrix."""
+        rows, columns, fractions = [], [], []
+        for item_position, item in enumerate(fridge_items):
+            item_words = frozenset(name_words(item["name"]))
+            if not item_words:
+                continue
+            available = parse_quantity(item.get("amount", ""))
+            # Only scan the recipes containing the item's rarest word
+            postings = min(
+                (self._ingredient_index.get(word, []) for word in item_words), key=len
+            )
+            for position, words, head, quantity in postings:
+                if uses_item(item_words, words, head):
+                    rows.append(position)
+                    columns.append(item_position)
+                    fractions.append(
+                        min(1.0, quantity / available)
+                        if quantity is not None and available
+                        else 1.0
+                    )
+
+        positions, rows = np.unique(np.array(rows, dtype=np.int64), return_inverse=True)
+        matrix = np.zeros((len(positions), len(fridge_items)), dtype=np.float32)
+        # A recipe listing an item twice uses the larger of the two amounts
+        np.maximum.at(matrix, (rows, np.array(columns, dtype=np.int64)), fractions)
+        return positions, matrix
+
+    @staticmethod
+    def item_values(fridge_items: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """CO2 at stake per item, weighted by how much of its shelf life is gone."""
+        return np.array(
+            [
+                item.get("co2_impact", 0.0)
+                * (1 - min(max(item.get("risk_percentage", 0.0), 0.0), 100.0) / 100)
+                for item in fridge_items
+            ],
+            dtype=np.float32,
+        )
+
+    @staticmethod
+    def _value(covered: np.ndarray, values: np.ndarray) -> float:
+        return float(np.minimum(covered, 1.0) @ values)
+
+    @staticmethod
+    def _gains(
+        matrix: np.ndarray, covered: np.ndarray, values: np.ndarray
+    ) -> np.ndarray:
+        """Marginal value of adding each candidate to the current plan."""
+        return (np.minimum(covered + matrix, 1.0) - np.minimum(covered, 1.0)) @ values
+
+    @staticmethod
+    def _undominated(
+        matrix: np.ndarray, values: np.ndarray, n_recipes: int
+    ) -> np.ndarray:
+        """Mask of the candidates that can be part of some optimal plan.
+
+        A recipe that uses no more of any item than n_recipes of the anchor
+        recipes can always be swapped for one of those not already in the plan
+        without losing value, so it never needs to be searched.
+        """
+        anchors = np.argsort(-(matrix @ values), kind="stable")[:DOMINANCE_ANCHORS]
+        dominators = np.zeros(len(matrix), dtype=np.int32)
+        for anchor in anchors:
+            dominators += (matrix[anchor] >= matrix).all(axis=1)
+        # Anchors dominate themselves, so they are compared against n_recipes + 1
+        dominators[anchors] -= 1
+        keep = dominators < n_recipes
+        keep[anchors] = True
+        return keep
+
+    def _greedy(
+        self, matrix: np.ndarray, values: np.ndarray, n_recipes: int
+    ) -> List[int]:
+        covered = np.zeros(matrix.shape[1], dtype=np.float32)
+        available = np.ones(len(matrix), dtype=bool)
+        selected = []
+        for _ in range(min(n_recipes, len(matrix))):
+            gains = np.where(available, self._gains(matrix, covered, values), -1.0)
+            best = int(np.argmax(gains))
+            if gains[best] <= 0:
+                break
+            selected.append(best)
+            available[best] = False
+            covered += matrix[best]
+        return selected
+
+    def _branch_and_bound(
+        self,
+        matrix: np.ndarray,
+        values: np.ndarray,
+        n_recipes: int,
+        incumbent: List[int],
+        max_evaluations: int,
+    ) -> List[int]:
+        best = list(incumbent)
+        best_value = self._value(matrix[best].sum(axis=0), values) if best else 0.0
+        evaluations = 0
+
+        def search(
+            candidates: np.ndarray, selected: List[int], covered: np.ndarray
+        ) -> None:
+            nonlocal best, best_value, evaluations
+            value = self._value(covered, values)
+            if value > best_value + 1e-9:
+                best, best_value = list(selected), value
+            slots = n_recipes - len(selected)
+            if slots == 0 or len(candidates) == 0 or evaluations >= max_evaluations:
+                return
+
+            gains = self._gains(matrix[candidates], covered, values)
+            evaluations += len(candidates)
+            order = np.argsort(-gains)
+            order = order[gains[order] > 0]
+            if len(order) and slots == 1:
+                # The last slot is simply filled with the best remaining recipe
+                if value + gains[order[0]] > best_value + 1e-9:
+                    best = selected + [int(candidates[order[0]])]
+                    best_value = value + float(gains[order[0]])
+                return
+            prefix = np.cumsum(gains[order])
+            for j, candidate in enumerate(candidates[order]):
+                # Submodularity: the subtree can add at most its `slots` best gains,
+                # and branch j only draws from candidates ranked after it
+                last = min(j + slots, len(order)) - 1
+                bound = value + prefix[last] - (prefix[j - 1] if j else 0.0)
+                if bound <= best_value + 1e-9 or evaluations >= max_evaluations:
+                    break
+                search(
+                    candidates[order[j + 1 :]],
+                    selected + [int(candidate)],
+                    covered + matrix[candidate],
+                )
+
+        search(np.arange(len(matrix)), [], np.zeros(matrix.shape[1], dtype=np.float32))
+        return best
+
+    def optimize(
+        self,
+        fridge_items: Sequence[Dict[str, Any]],
+        n_recipes: int = 3,
+        exact: bool = True,
+        max_evaluations: int = DEFAULT_MAX_EVALUATIONS,
+    ) -> Dict[str, Any]:
+        """Pick up to n_recipes recipes that rescue the most urgency-weighted CO2.
+
+        Every plan entry lists the fridge items it uses (`uses`) and the
+        positions in its recipe's `ingredients` that they matched
+        (`matched_ingredients`).
+        """
+        started = time.perf_counter()
+        values = self.item_values(fridge_items)
+        positions, matrix = self.usage_matrix(fridge_items)
+
+        # Recipes that rescue nothing can never be part of an optimal plan
+        useful = (matrix @ values) > 0
+        positions, matrix = positions[useful], matrix[useful]
+        if exact and len(matrix) > n_recipes:
+            keep = self._undominated(matrix, values, n_recipes)
+            positions, matrix = positions[keep], matrix[keep]
+
+        selected = self._greedy(matrix, values, n_recipes)
+        if exact and len(matrix) > n_recipes:
+            selected = self._branch_and_bound(
+                matrix, values, n_recipes, selected, max_evaluations
+            )
+
+        covered = np.zeros(len(fridge_items), dtype=np.float32)
+        plan = []
+        for row in selected:
+            gain = float(self._gains(matrix[row : row + 1], covered, values)[0])
+            covered += matrix[row]
+            recipe = self.recipes[positions[row]]
+            used_items = [
+                frozenset(name_words(fridge_items[i]["name"]))
+                for i in np.flatnonzero(matrix[row])
+            ]
+            plan.append(
+                {
+                    "title": recipe.get("title", "Unnamed Recipe"),
+                    "uses": [
+                        fridge_items[i]["name"] for i in np.flatnonzero(matrix[row])
+                    ],
+                    "matched_ingredients": [
+                        position
+                        for position, ing in enumerate(recipe.get("ingredients", []))
+                        if any(
+                            ingredient_uses_item(ing.get("name", ""), item_words)
+                            for item_words in used_items
+                        )
+                    ],
+                    "co2_rescued": round(gain, 3),
+                    "recipe": recipe,
+                }
+            )
+
+        return {
+            "recipes": plan,
+            "total_co2_rescued": round(self._value(covered, values), 3),
+            "unused_items": [
+                item["name"]
+                for item, amount, value in zip(fridge_items, covered, values)
+                if amount == 0 and value > 0
+            ],
+            "candidates": int(len(matrix)),
+            "seconds": time.perf_counter() - started,
+        }
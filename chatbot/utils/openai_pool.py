@@ -0,0 +1,575 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# (requests per minute, tokens per minute) per model, or per endpoint path for
+# multipart requests; the defaults are the usage tier 1 limits of the models
+# this app calls. They only apply until the first response, whose
+# x-ratelimit-* headers carry the account's actual limits; override them via
+# `model_limits` or the OPENAI_MODEL_LIMITS environment variable
+DEFAULT_MODEL_LIMITS = {
+    "gpt-4o": (500, 30_000),
+    "gpt-3.5-turbo-1106": (3_500, 200_000),
+    "text-embedding-3-large": (3_000, 1_000_000),
+    "/v1/audio/transcriptions": (500, 1_000_000),
+}
+DEFAULT_LIMITS = (500, 200_000)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_POLL_INTERVAL = 0.05
+
+_priority: ContextVar[str] = ContextVar("openai_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """Run the OpenAI calls made in this context (and tasks it starts) as background work."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def model_limits_from_env(
+    variable: str = "OPENAI_MODEL_LIMITS",
+) -> Dict[str, Tuple[float, float]]:
+    """Per-model limits from a JSON object such as {"gpt-4o": [5000, 800000]}."""
+    value = os.environ.get(variable)
+    if not value:
+        return {}
+    try:
+        return {
+            model: (float(requests), float(tokens))
+            for model, (requests, tokens) in json.loads(value).items()
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError(
+            f"{variable} must map model names to [requests, tokens] per minute"
+        ) from e
+
+
+def estimate_tokens(body: Dict[str, Any]) -> int:
+    """Rough token cost of a request: prompt characters / 4 plus the completion cap.
+
+    OpenAI counts the completion cap against the token limit as well, so it is
+    reserved up front rather than refunded after the response.
+    """
+    chars = 0
+    for message in body.get("messages", []):
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content)
+        chars += len(content)
+    inputs = body.get("input", "")
+    for item in inputs if isinstance(inputs, list) else [inputs]:
+        # Pre-tokenized input is a list of token ids
+        chars += len(item) * 4 if isinstance(item, list) else len(str(item))
+    completion = body.get("max_completion_tokens") or body.get("max_tokens") or 0
+    return chars // 4 + completion
+
+
+def request_budget(request: httpx.Request) -> Tuple[str, int]:
+    """Rate limit key (model, or endpoint path for non-JSON requests) and token cost."""
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = json.loads(request.content)
+            return body.get("model", request.url.path), estimate_tokens(body)
+        except (httpx.RequestNotRead, ValueError):
+            pass
+    # Multipart uploads such as audio transcriptions are not parsed
+    return request.url.path, 0
+
+
+class TokenBucket:
+    """Requests and tokens available to one model, refilled continuously."""
+
+    def __init__(
+        self, requests_per_minute: float, tokens_per_minute: float, burst_seconds: float
+    ):
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self.rate = {
+            "requests": requests_per_minute / 60,
+            "tokens": tokens_per_minute / 60,
+        }
+        self.capacity = {
+            name: max(1.0, rate * burst_seconds) for name, rate in self.rate.items()
+        }
+        self.available = dict(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def set_limits(
+        self, requests_per_minute: float, tokens_per_minute: float, burst_seconds: float
+    ) -> None:
+        """Resize the bucket, keeping what has been used of the current burst."""
+        self.limits = (requests_per_minute, tokens_per_minute)
+        for name, limit in zip(("requests", "tokens"), self.limits):
+            used = self.capacity[name] - self.available[name]
+            self.rate[name] = limit / 60
+            self.capacity[name] = max(1.0, self.rate[name] * burst_seconds)
+            self.available[name] = self.capacity[name] - used
+
+    def refill(self, now: float) -> None:
+        elapsed, self.updated = now - self.updated, now
+        for name, rate in self.rate.items():
+            self.available[name] = min(
+                self.capacity[name], self.available[name] + rate * elapsed
+            )
+
+    def wait_time(self, tokens: float, reserve: float) -> float:
+        """Seconds until a request fits while keeping `reserve` of the bucket free."""
+        needed = {
+            "requests": 1 + reserve * self.capacity["requests"],
+            "tokens": tokens + reserve * self.capacity["tokens"],
+        }
+        return max(
+            (min(needed[name], self.capacity[name]) - self.available[name])
+            / self.rate[name]
+            for name in needed
+        )
+
+    def take(self, tokens: float) -> None:
+        self.available["requests"] -= 1
+        self.available["tokens"] -= tokens
+
+
+class PriorityRateLimiter:
+    """Per-model token buckets and a global concurrency budget with two priorities.
+
+    Shared by sync callers (thread pool tools, index builds) and coroutines.
+    Background requests leave `background_reserve` of every bucket and of the
+    concurrency budget to interactive requests, and yield to interactive
+    requests waiting for the same model. A 429 blocks the model for everyone
+    until the server's retry delay has passed.
+    """
+
+    def __init__(
+        self,
+        model_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        default_limits: Tuple[float, float] = DEFAULT_LIMITS,
+        max_concurrency: int = 32,
+        background_reserve: float = 0.2,
+        burst_seconds: float = 10.0,
+        limits_from_headers: bool = True,
+    ):
+        self.model_limits = dict(DEFAULT_MODEL_LIMITS, **(model_limits or {}))
+        self.default_limits = default_limits
+        self.max_concurrency = max_concurrency
+        self.background_reserve = background_reserve
+        self.burst_seconds = burst_seconds
+        self.limits_from_headers = limits_from_headers
+        self.in_flight = 0
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._interactive_waiting: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _bucket(self, model: str) -> TokenBucket:
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            requests, tokens = self.model_limits.get(model, self.default_limits)
+            bucket = self._buckets[model] = TokenBucket(
+                requests, tokens, self.burst_seconds
+            )
+        return bucket
+
+    def _try_acquire(self, model: str, tokens: int, priority: str) -> float:
+        """Take a slot and return 0, or return how long to wait before retrying."""
+        now = time.monotonic()
+        bucket = self._bucket(model)
+        bucket.refill(now)
+        if now < bucket.blocked_until:
+            return bucket.blocked_until - now
+
+        reserve = 0.0
+        slots = self.max_concurrency
+        if priority == BACKGROUND:
+            if self._interactive_waiting[model]:
+                return MAX_POLL_INTERVAL
+            reserve = self.background_reserve
+            slots = max(1, int(self.max_concurrency * (1 - reserve)))
+        if self.in_flight >= slots:
+            return MAX_POLL_INTERVAL
+
+        # A single request may exceed the bucket, cap it so it can still run
+        tokens = min(tokens, bucket.capacity["tokens"] * (1 - reserve))
+        wait = bucket.wait_time(tokens, reserve)
+        if wait > 0:
+            return wait
+        bucket.take(tokens)
+        self.in_flight += 1
+        return 0.0
+
+    def _set_waiting(self, model: str, priority: str, delta: int) -> None:
+        if priority == INTERACTIVE:
+            with self._lock:
+                self._interactive_waiting[model] += delta
+
+    def acquire(self, model: str, tokens: int, priority: str = INTERACTIVE) -> float:
+        """Block until the request may be sent; returns the seconds waited."""
+        started = time.monotonic()
+        waiting = False
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_acquire(model, tokens, priority)
+                if not wait:
+                    return time.monotonic() - started
+                if not waiting:
+                    self._set_waiting(model, priority, 1)
+                    waiting = True
+                time.sleep(min(wait, MAX_POLL_INTERVAL))
+        finally:
+            if waiting:
+                self._set_waiting(model, priority, -1)
+
+    async def aacquire(
+        self, model: str, tokens: int, priority: str = INTERACTIVE
+    ) -> float:
+        """Wait until the request may be sent; returns the seconds waited."""
+        started = time.monotonic()
+        waiting = False
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_acquire(model, tokens, priority)
+                if not wait:
+                    return time.monotonic() - started
+                if not waiting:
+                    self._set_waiting(model, priority, 1)
+                    waiting = True
+                await asyncio.sleep(min(wait, MAX_POLL_INTERVAL))
+        finally:
+            if waiting:
+                self._set_waiting(model, priority, -1)
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def observe(self, model: str, headers: httpx.Headers) -> None:
+        """Adopt the per-minute limits and remaining budget reported by the server.
+
+        OpenAI sends x-ratelimit-limit-{requests,tokens} and
+        x-ratelimit-remaining-{requests,tokens} on every response; the remaining
+        budget also accounts for other processes sharing the API key.
+        """
+        if not self.limits_from_headers:
+            return
+        try:
+            reported = {
+                name: (
+                    float(headers[f"x-ratelimit-limit-{name}"]),
+                    float(headers.get(f"x-ratelimit-remaining-{name}", "inf")),
+                )
+                for name in ("requests", "tokens")
+                if f"x-ratelimit-limit-{name}" in headers
+            }
+        except ValueError:
+            return
+        if not reported:
+            return
+        with self._lock:
+            bucket = self._bucket(model)
+            limits = tuple(
+                reported.get(name, (limit, None))[0]
+                for name, limit in zip(("requests", "tokens"), bucket.limits)
+            )
+            if limits != bucket.limits:
+                self.model_limits[model] = limits
+                bucket.set_limits(*limits, self.burst_seconds)
+            bucket.refill(time.monotonic())
+            for name, (_, remaining) in reported.items():
+                bucket.available[name] = min(bucket.available[name], remaining)
+
+    def block(self, model: str, seconds: float) -> None:
+        """Hold back every request for `model`, e.g. after the server returned 429."""
+        with self._lock:
+            bucket = self._bucket(model)
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+
+
+def retry_delay(
+    attempt: int,
+    headers: Optional[httpx.Headers] = None,
+    base: float = 0.5,
+    maximum: float = 20.0,
+) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's retry-after."""
+    delay = random.uniform(0, min(maximum, base * 2**attempt))
+    if headers is not None:
+        try:
+            if "retry-after-ms" in headers:
+                return max(delay, float(headers["retry-after-ms"]) / 1000)
+            if "retry-after" in headers:
+                return max(delay, float(headers["retry-after"]))
+        except ValueError:
+            pass
+    return delay
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that frees its concurrency slot once the body is closed."""
+
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            release, self._release = self._release, None
+            if release:
+                release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    """Async response body that frees its concurrency slot once it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            release, self._release = self._release, None
+            if release:
+                release()
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport applying the pool's rate limits and retries to sync clients."""
+
+    def __init__(self, transport: httpx.BaseTransport, pool: "OpenAIClientPool"):
+        self._transport = transport
+        self._pool = pool
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        pool, limiter = self._pool, self._pool.limiter
+        model, tokens = request_budget(request)
+        priority = _priority.get()
+        for attempt in range(pool.max_retries + 1):
+            waited = limiter.acquire(model, tokens, priority)
+            pool.record(priority, "wait_seconds", waited)
+            pool.record(priority, "requests")
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError:
+                limiter.release()
+                if attempt == pool.max_retries:
+                    raise
+                delay = retry_delay(attempt)
+            except BaseException:
+                # Cancelled or interrupted callers give their slot back too
+                limiter.release()
+                raise
+            else:
+                limiter.observe(model, response.headers)
+                if (
+                    response.status_code not in RETRY_STATUS_CODES
+                    or attempt == pool.max_retries
+                ):
+                    response.stream = _ReleasingStream(response.stream, limiter.release)
+                    return response
+                try:
+                    response.close()
+                finally:
+                    limiter.release()
+                delay = retry_delay(attempt, response.headers)
+                pool.note_failure(model, priority, response.status_code, delay)
+            pool.record(priority, "retries")
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """httpx transport applying the pool's rate limits and retries to async clients."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, pool: "OpenAIClientPool"):
+        self._transport = transport
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        pool, limiter = self._pool, self._pool.limiter
+        model, tokens = request_budget(request)
+        priority = _priority.get()
+        for attempt in range(pool.max_retries + 1):
+            waited = await limiter.aacquire(model, tokens, priority)
+            pool.record(priority, "wait_seconds", waited)
+            pool.record(priority, "requests")
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError:
+                limiter.release()
+                if attempt == pool.max_retries:
+                    raise
+                delay = retry_delay(attempt)
+            except BaseException:
+                # Cancelled or interrupted callers give their slot back too
+                limiter.release()
+                raise
+            else:
+                limiter.observe(model, response.headers)
+                if (
+                    response.status_code not in RETRY_STATUS_CODES
+                    or attempt == pool.max_retries
+                ):
+                    response.stream = _AsyncReleasingStream(
+                        response.stream, limiter.release
+                    )
+                    return response
+                try:
+                    await response.aclose()
+                finally:
+                    limiter.release()
+                delay = retry_delay(attempt, response.headers)
+                pool.note_failure(model, priority, response.status_code, delay)
+            pool.record(priority, "retries")
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class OpenAIClientPool:
+    """Process-wide OpenAI client layer shared by every component of the app.
+
+    One keep-alive connection pool per sync/async client, per-model request
+    and token budgets, interactive-over-background prioritisation (see
+    `background_priority`) and jittered retries on 429/5xx, applied at the
+    HTTP transport so that the OpenAI SDK and the llama_index OpenAI classes
+    go through it unchanged. The SDK's own retries are disabled.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        model_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_concurrency: int = 32,
+        max_connections: int = 64,
+        max_keepalive_connections: int = 32,
+        keepalive_expiry: float = 30.0,
+        max_retries: int = 5,
+        timeout: float = 60.0,
+        **limiter_kwargs: Any,
+    ):
+        """Initialize the shared clients, connection pools and rate limiter."""
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.limiter = PriorityRateLimiter(
+            model_limits, max_concurrency=max_concurrency, **limiter_kwargs
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.http_client = httpx.Client(
+            transport=RateLimitedTransport(
+                httpx.HTTPTransport(limits=self.limits), self
+            ),
+            timeout=timeout,
+        )
+        self.async_http_client = self.new_async_http_client()
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.async_http_client,
+            max_retries=0,
+        )
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {
+                "requests": 0,
+                "retries": 0,
+                "rate_limited": 0,
+                "server_errors": 0,
+                "wait_seconds": 0.0,
+            }
+        )
+
+    def new_async_http_client(self) -> httpx.AsyncClient:
+        """A separate async connection pool under the same rate limits.
+
+        Keep-alive connections belong to the event loop that opened them, so
+        work run in a throwaway loop (`asyncio.run` at startup) must use its
+        own client and close it before the loop ends, rather than leave dead
+        connections in the shared one.
+        """
+        return httpx.AsyncClient(
+            transport=AsyncRateLimitedTransport(
+                httpx.AsyncHTTPTransport(limits=self.limits), self
+            ),
+            timeout=self.timeout,
+        )
+
+    def llama_index_kwargs(
+        self, async_http_client: Optional[httpx.AsyncClient] = None
+    ) -> Dict[str, Any]:
+        """Constructor arguments routing llama_index's OpenAI LLM/embeddings through the pool."""
+        return {
+            "api_key": self.api_key,
+            "api_base": self.base_url,
+            "http_client": self.http_client,
+            "async_http_client": async_http_client or self.async_http_client,
+            "max_retries": 0,
+        }
+
+    def record(self, priority: str, counter: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            self._stats[priority][counter] += amount
+
+    def note_failure(
+        self, model: str, priority: str, status_code: int, delay: float
+    ) -> None:
+        """Count a retryable response; a 429 backs off every caller of the model."""
+        if status_code == 429:
+            self.limiter.block(model, delay)
+            self.record(priority, "rate_limited")
+        else:
+            self.record(priority, "server_errors")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-priority request, retry, failure and queueing counters."""
+        with self._stats_lock:
+            return {priority: dict(stats) for priority, stats in self._stats.items()}
+
+    def close(self) -> None:
+        self.http_client.close()
+
+    async def aclose(self) -> None:
+        await self.async_http_client.aclose()
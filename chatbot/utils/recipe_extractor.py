@@ -9,9 +9,9 @@ from openai import OpenAI
 
 
 class RecipeExtractor:
-    def __init__(self, api_key: str):
-        """Initialize the RecipeExtractor with OpenAI API key."""
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, api_key: Optional[str] = None, client: Optional[OpenAI] = None):
+        """Initialize the RecipeExtractor with a shared OpenAI client or an API key."""
+        self.client = client or OpenAI(api_key=api_key)
         self.supported_domains = {
             "chefkoch.de": self._extract_chefkoch,
             "kitchenstories.com": self._extract_kitchenstories,
@@ -0,0 +1,335 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+from llama_index.core import VectorStoreIndex
+
+# text-embedding-3 vectors can be truncated and renormalized (Matryoshka
+# embeddings), which keeps ranking quality while making the matrix small
+# enough for sub-millisecond dot products
+DEFAULT_DIMENSIONS = 256
+DEFAULT_SUSTAINABILITY_WEIGHT = 0.3
+
+LIKE_WEIGHT = 1.0
+SKIP_WEIGHT = -0.5
+PREFERENCE_DECAY = 0.9
+
+# Swipes are written to disk at most once per SAVE_DELAY seconds
+SAVE_DELAY = 5.0
+
+# Above IVF_MIN_RECIPES recipes, ranking only scores the N_PROBE clusters
+# closest to the user instead of the whole matrix
+IVF_MIN_RECIPES = 20_000
+N_PROBE = 8
+KMEANS_ITERATIONS = 5
+KMEANS_SAMPLE = 20_000
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    iterations: int = KMEANS_ITERATIONS,
+    sample: int = KMEANS_SAMPLE,
+    seed: int = 0,
+) -> np.ndarray:
+    """Cluster labels of normalized vectors, trained on a sample of them."""
+    rng = np.random.default_rng(seed)
+    train = vectors[np.sort(rng.choice(len(vectors), min(sample, len(vectors)), False))]
+    centroids = train[rng.choice(len(train), n_clusters, replace=False)]
+    for _ in range(iterations):
+        labels = np.argmax(train @ centroids.T, axis=1)
+        order = np.argsort(labels, kind="stable")
+        present, starts = np.unique(labels[order], return_index=True)
+        # Empty clusters keep their previous centroid
+        centroids[present] = normalize_rows(np.add.reduceat(train[order], starts))
+    return np.concatenate(
+        [
+            np.argmax(vectors[start : start + 8192] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), 8192)
+        ]
+    )
+
+
+class UserPreferenceStore:
+    """Per-user preference vectors and swiped recipe ids, persisted in one .npz file.
+
+    Vectors are stored as float16. Users marked as transient (e.g. anonymous
+    sessions) are kept in memory only.
+    """
+
+    def __init__(self, dimensions: int, path: Optional[str] = None):
+        self.dimensions = dimensions
+        self.path = path
+        self.vectors: Dict[str, np.ndarray] = {}
+        self.seen: Dict[str, Set[str]] = {}
+        self.transient: Set[str] = set()
+        self._lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        if path and os.path.exists(path):
+            self.load()
+
+    def get(self, user_id: str) -> Optional[np.ndarray]:
+        return self.vectors.get(user_id)
+
+    def seen_for(self, user_id: str) -> Set[str]:
+        """Copy of the recipe ids the user has swiped, safe to iterate while swiping."""
+        with self._lock:
+            return set(self.seen.get(user_id, ()))
+
+    def update(
+        self, user_id: str, recipe_id: str, recipe_vector: np.ndarray, weight: float
+    ) -> None:
+        """Decay the user's vector, add the (weighted) recipe vector and mark it seen."""
+        with self._lock:
+            vector = self.vectors.get(user_id)
+            if vector is None:
+                vector = np.zeros(self.dimensions, dtype=np.float32)
+            self.vectors[user_id] = PREFERENCE_DECAY * vector + weight * recipe_vector
+            self.seen.setdefault(user_id, set()).add(recipe_id)
+
+    def request_save(self, delay: float = SAVE_DELAY) -> None:
+        """Save after `delay` seconds, batching all swipes made in the meantime."""
+        if not self.path:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(delay, self._flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._save_timer = None
+        self.save()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            user_ids = [u for u in self.vectors if u not in self.transient]
+            matrix = (
+                np.stack([self.vectors[user_id] for user_id in user_ids])
+                if user_ids
+                else np.zeros((0, self.dimensions))
+            )
+            seen = [
+                (i, recipe_id)
+                for i, user_id in enumerate(user_ids)
+                for recipe_id in self.seen.get(user_id, ())
+            ]
+        tmp_path = self.path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            user_ids=np.array(user_ids, dtype=str),
+            vectors=matrix.astype(np.float16),
+            seen_users=np.array([i for i, _ in seen], dtype=np.int32),
+            seen_recipes=np.array([recipe_id for _, recipe_id in seen], dtype=str),
+        )
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> None:
+        with np.load(self.path) as data:
+            if data["vectors"].shape[1:] != (self.dimensions,):
+                return
+            user_ids = [str(user_id) for user_id in data["user_ids"]]
+            self.vectors = {
+                user_id: vector.astype(np.float32)
+                for user_id, vector in zip(user_ids, data["vectors"])
+            }
+            if "seen_users" in data:
+                for i, recipe_id in zip(data["seen_users"], data["seen_recipes"]):
+                    self.seen.setdefault(user_ids[i], set()).add(str(recipe_id))
+
+
+class RecipeRecommender:
+    """Real-time recipe recommender driven by swipe feedback.
+
+    Recipe embeddings are truncated to `dimensions`, normalized and stacked
+    into one float32 matrix. A user's preference vector is updated in place on
+    every like or skip, and ranking is a matrix-vector product blended with
+    the recipes' sustainability scores. Large catalogs are stored grouped by
+    k-means cluster (an IVF index), so ranking only scores the rows of the
+    `N_PROBE` clusters closest to the user.
+    """
+
+    def __init__(
+        self,
+        recipe_ids: Sequence[str],
+        embeddings: np.ndarray,
+        metadata: Sequence[Dict[str, Any]],
+        dimensions: int = DEFAULT_DIMENSIONS,
+        sustainability_weight: float = DEFAULT_SUSTAINABILITY_WEIGHT,
+        preferences_path: Optional[str] = None,
+    ):
+        """Initialize the recommender from recipe ids, embeddings and metadata."""
+        self.dimensions = min(dimensions, embeddings.shape[1])
+        vectors = normalize_rows(
+            np.asarray(embeddings[:, : self.dimensions], dtype=np.float32)
+        )
+        recipe_ids, metadata = list(recipe_ids), list(metadata)
+
+        self._cluster_offsets: Optional[np.ndarray] = None
+        if len(recipe_ids) >= IVF_MIN_RECIPES:
+            # Reorder recipes by cluster so every cluster is a contiguous slice
+            labels = spherical_kmeans(vectors, int(np.sqrt(len(recipe_ids))))
+            order = np.argsort(labels, kind="stable")
+            vectors = vectors[order]
+            recipe_ids = [recipe_ids[i] for i in order]
+            metadata = [metadata[i] for i in order]
+            _, starts = np.unique(labels[order], return_index=True)
+            self._cluster_offsets = np.append(starts, len(recipe_ids))
+
+        self.recipe_ids = recipe_ids
+        self.metadata = metadata
+        sustainability = np.array(
+            [float(m.get("sustainability_score", 5.0)) / 10 for m in self.metadata],
+            dtype=np.float32,
+        )
+        # Sustainability is stored as an extra column so that similarity and
+        # sustainability blending are computed by one matrix-vector product
+        self.matrix = np.empty((len(self.recipe_ids), self.dimensions + 1), np.float32)
+        self.matrix[:, :-1] = vectors
+        self.matrix[:, -1] = sustainability
+        self.embeddings = self.matrix[:, :-1]
+        if self._cluster_offsets is not None:
+            self.centroids = np.add.reduceat(
+                self.matrix, self._cluster_offsets[:-1]
+            ) / np.diff(self._cluster_offsets)[:, None].astype(np.float32)
+        self.sustainability_weight = sustainability_weight
+        self.users = UserPreferenceStore(self.dimensions, preferences_path)
+        self._positions = {key: i for i, key in enumerate(self.recipe_ids)}
+        self._positions.update(
+            {m["title"].lower(): i for i, m in enumerate(self.metadata) if "title" in m}
+        )
+
+    @classmethod
+    def from_index(cls, index: VectorStoreIndex, **kwargs: Any) -> "RecipeRecommender":
+        """Build the recommender from the vectors of an existing recipe index."""
+        embedding_dict = index.vector_store.to_dict()["embedding_dict"]
+        recipe_ids = [
+            node_id
+            for node_id in index.index_struct.nodes_dict
+            if node_id in embedding_dict
+        ]
+        nodes = index.docstore.get_nodes(recipe_ids)
+        embeddings = np.array(
+            [embedding_dict[node_id] for node_id in recipe_ids], dtype=np.float32
+        )
+        return cls(recipe_ids, embeddings, [node.metadata for node in nodes], **kwargs)
+
+    @classmethod
+    def from_ingested(cls, output_dir: str, **kwargs: Any) -> "RecipeRecommender":
+        """Build the recommender from a store written by utils.streaming_ingestion."""
+        with open(os.path.join(output_dir, "checkpoint.json"), "r") as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        embeddings = np.memmap(
+            os.path.join(output_dir, "embeddings.f32"),
+            dtype=np.float32,
+            mode="r",
+            shape=(checkpoint["documents"], checkpoint["dimensions"]),
+        )
+        recipe_ids, metadata = [], []
+        with open(os.path.join(output_dir, "nodes.jsonl"), "r") as nodes_file:
+            for _, line in zip(range(checkpoint["documents"]), nodes_file):
+                node = json.loads(line)
+                recipe_ids.append(node["id_"])
+                metadata.append(node["metadata"])
+        return cls(recipe_ids, embeddings, metadata, **kwargs)
+
+    def position(self, recipe: str) -> Optional[int]:
+        """Row of a recipe given its node id or title."""
+        return self._positions.get(recipe, self._positions.get(recipe.lower()))
+
+    def project(self, vector: Sequence[float]) -> np.ndarray:
+        """Truncate and normalize an external embedding to the recommender space."""
+        vector = np.asarray(vector, dtype=np.float32)[: self.dimensions]
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def record_feedback(
+        self, user_id: str, recipe: str, liked: bool, persist: bool = True
+    ) -> bool:
+        """Update a user's preferences after a like (right swipe) or skip.
+
+        With persist=False the user's profile only lives for this process,
+        e.g. for anonymous sessions that cannot be recognized again.
+        """
+        position = self.position(recipe)
+        if position is None:
+            return False
+        if not persist:
+            self.users.transient.add(user_id)
+        self.users.update(
+            user_id,
+            self.recipe_ids[position],
+            self.embeddings[position],
+            LIKE_WEIGHT if liked else SKIP_WEIGHT,
+        )
+        return True
+
+    def _weights(
+        self, user_id: str, query_vector: Optional[Sequence[float]] = None
+    ) -> np.ndarray:
+        preference = self.users.get(user_id)
+        if preference is not None and preference.any():
+            preference = preference / np.linalg.norm(preference)
+        if query_vector is not None:
+            query = self.project(query_vector)
+            preference = query if preference is None else preference + query
+        weights = np.zeros(self.dimensions + 1, dtype=np.float32)
+        weights[-1] = self.sustainability_weight
+        if preference is not None and preference.any():
+            weights[:-1] = (1 - self.sustainability_weight) * (
+                preference / np.linalg.norm(preference)
+            )
+        return weights
+
+    def scores(
+        self, user_id: str, query_vector: Optional[Sequence[float]] = None
+    ) -> np.ndarray:
+        """Blended relevance scores of all recipes for a user."""
+        return self.matrix @ self._weights(user_id, query_vector)
+
+    def recommend(
+        self,
+        user_id: str,
+        k: int = 5,
+        query_vector: Optional[Sequence[float]] = None,
+    ) -> List[int]:
+        """Positions of the top-k recipes the user has not swiped yet."""
+        weights = self._weights(user_id, query_vector)
+        if self._cluster_offsets is None:
+            candidates = None
+            scores = self.matrix @ weights
+        else:
+            offsets = self._cluster_offsets
+            probe = np.argsort(-(self.centroids @ weights))[:N_PROBE]
+            candidates = np.concatenate(
+                [np.arange(offsets[c], offsets[c + 1]) for c in probe]
+            )
+            scores = np.concatenate(
+                [self.matrix[offsets[c] : offsets[c + 1]] @ weights for c in probe]
+            )
+
+        seen = [
+            self._positions[recipe_id]
+            for recipe_id in self.users.seen_for(user_id)
+            if recipe_id in self._positions
+        ]
+        if seen:
+            if candidates is None:
+                scores[seen] = -np.inf
+            else:
+                scores[np.isin(candidates, seen)] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(scores, len(scores) - k)[-k:]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return (top if candidates is None else candidates[top]).tolist()
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set, Tuple
+
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.base.response.schema import RESPONSE_TYPE
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.prompts.mixin import PromptMixinType
+from llama_index.core.schema import QueryBundle
+
+
+def normalize_key(value: Any) -> Any:
+    """Turn call arguments into a hashable key, collapsing insignificant whitespace.
+
+    Use it for arguments whose meaning does not depend on exact whitespace,
+    such as user queries; pass exact keys where it does, e.g. embedding input.
+    """
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize_key(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(normalize_key(v) for v in value)
+    return value
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into a single upstream call.
+
+    The first caller for a key runs the function, every caller that arrives
+    while it is in flight waits for the same result (or exception). The entry
+    is removed as soon as the call finishes, so results are never cached
+    beyond the in-flight window. Sync callers (e.g. thread pool workers) use
+    `do`, coroutines use `ado`; both share the same in-flight table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Tuple[str, Hashable], Future] = {}
+        # Strong references to the running shared calls of `ado`
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "executed": 0, "coalesced": 0, "errors": 0}
+        )
+
+    def _join(self, namespace: str, key: Hashable) -> Tuple[Future, bool]:
+        flight_key = (namespace, key)
+        with self._lock:
+            stats = self._stats[namespace]
+            stats["calls"] += 1
+            future = self._in_flight.get(flight_key)
+            if future is not None:
+                stats["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._in_flight[flight_key] = future
+            stats["executed"] += 1
+            return future, True
+
+    def _finish(self, namespace: str, key: Hashable, future: Future) -> None:
+        with self._lock:
+            self._in_flight.pop((namespace, key), None)
+            if future.exception() is not None:
+                self._stats[namespace]["errors"] += 1
+
+    def do(
+        self, namespace: str, key: Hashable, fn: Callable[..., Any], *args, **kwargs
+    ) -> Any:
+        """Call fn(*args, **kwargs) unless an identical call is already in flight."""
+        future, leader = self._join(namespace, key)
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            self._finish(namespace, key, future)
+        return future.result()
+
+    async def ado(
+        self, namespace: str, key: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Await fn() unless an identical call is already in flight.
+
+        The shared call runs in its own task and every caller, the first one
+        included, awaits it through a shield: a caller that is cancelled (tool
+        timeout, user pressing stop) stops waiting without cancelling the call
+        for everybody else.
+        """
+        future, leader = self._join(namespace, key)
+        if leader:
+            task = asyncio.ensure_future(fn())
+            self._tasks.add(task)
+            task.add_done_callback(
+                lambda task: self._settle(namespace, key, future, task)
+            )
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _settle(
+        self, namespace: str, key: Hashable, future: Future, task: asyncio.Task
+    ) -> None:
+        self._tasks.discard(task)
+        try:
+            if task.cancelled():
+                future.set_exception(asyncio.CancelledError())
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+        finally:
+            self._finish(namespace, key, future)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-namespace counters; `coalesced` is the number of upstream calls saved."""
+        with self._lock:
+            return {namespace: dict(stats) for namespace, stats in self._stats.items()}
+
+
+class SingleFlightQueryEngine(BaseQueryEngine):
+    """Query engine wrapper that coalesces identical in-flight queries."""
+
+    def __init__(
+        self, query_engine: BaseQueryEngine, flight: SingleFlight, namespace: str
+    ):
+        self._query_engine = query_engine
+        self._flight = flight
+        self._namespace = namespace
+        super().__init__(callback_manager=query_engine.callback_manager)
+
+    def _get_prompt_modules(self) -> PromptMixinType:
+        return {"query_engine": self._query_engine}
+
+    def _query(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        return self._flight.do(
+            self._namespace,
+            normalize_key(query_bundle.query_str),
+            self._query_engine.query,
+            query_bundle,
+        )
+
+    async def _aquery(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        return await self._flight.ado(
+            self._namespace,
+            normalize_key(query_bundle.query_str),
+            lambda: self._query_engine.aquery(query_bundle),
+        )
+
+
+class SingleFlightEmbedding(BaseEmbedding):
+    """Embedding wrapper that coalesces identical in-flight embedding requests.
+
+    Single texts are coalesced by exact content; batch requests are passed
+    through unchanged since they are issued by index builds, not by sessions.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _flight: SingleFlight = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, flight: SingleFlight, **kwargs):
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            callback_manager=embed_model.callback_manager,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._flight = flight
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SingleFlightEmbedding"
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._flight.do(
+            "embed_query",
+            (self.model_name, query),
+            self._embed_model._get_query_embedding,
+            query,
+        )
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self._flight.ado(
+            "embed_query",
+            (self.model_name, query),
+            lambda: self._embed_model._aget_query_embedding(query),
+        )
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._flight.do(
+            "embed_text",
+            (self.model_name, text),
+            self._embed_model._get_text_embedding,
+            text,
+        )
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self._flight.ado(
+            "embed_text",
+            (self.model_name, text),
+            lambda: self._embed_model._aget_text_embedding(text),
+        )
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed_model._get_text_embeddings(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._embed_model._aget_text_embeddings(texts)
@@ -0,0 +1,362 @@
+"""Streaming bulk ingestion of large JSONL recipe corpora.
+
+Reads `{"text": ..., "metadata": {...}}` records line by line, embeds them in
+concurrent batches under request/token rate limits and appends the results to
+an on-disk store:
+
+    <output>/nodes.jsonl      one node per line (id, text, metadata)
+    <output>/embeddings.f32   float32 embedding rows, same order as nodes.jsonl
+    <output>/checkpoint.json  input lines consumed and output sizes committed
+
+Only `max_concurrency` batches are held in memory at any time. The checkpoint
+is rewritten atomically after every committed batch; an interrupted run
+truncates any partially written output back to the checkpoint and resumes from
+the next unprocessed input line.
+
+Usage (from the chatbot directory):
+
+    python -m utils.streaming_ingestion datasets/recipes.jsonl cache/recipes_stream
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import time
+from array import array
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from llama_index.core import Document, VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import MetadataMode, TextNode
+
+NODES_FILE = "nodes.jsonl"
+EMBEDDINGS_FILE = "embeddings.f32"
+CHECKPOINT_FILE = "checkpoint.json"
+FLOAT_SIZE = 4
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def iter_jsonl(path: str, skip_lines: int = 0) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line_number, record) pairs, skipping already ingested lines."""
+    with open(path, "r") as jsonl_file:
+        for line_number, line in enumerate(jsonl_file, start=1):
+            if line_number <= skip_lines or not line.strip():
+                continue
+            yield line_number, json.loads(line)
+
+
+class RateLimiter:
+    """Token bucket limiting requests and tokens per minute."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.capacity = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self.available = dict(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed, self.updated = now - self.updated, now
+        for name, capacity in self.capacity.items():
+            self.available[name] = min(
+                capacity, self.available[name] + capacity * elapsed / 60
+            )
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait until one request with `tokens` tokens fits into the budget."""
+        # A single batch may exceed the per-minute token budget, cap the request
+        tokens = min(tokens, self.capacity["tokens"])
+        async with self._lock:
+            while True:
+                self._refill()
+                if (
+                    self.available["requests"] >= 1
+                    and self.available["tokens"] >= tokens
+                ):
+                    self.available["requests"] -= 1
+                    self.available["tokens"] -= tokens
+                    return
+                missing = max(
+                    (1 - self.available["requests"]) / self.capacity["requests"],
+                    (tokens - self.available["tokens"]) / self.capacity["tokens"],
+                )
+                await asyncio.sleep(max(missing * 60, 0.01))
+
+
+class StreamingIngestor:
+    """Embeds a JSONL corpus into an append-only on-disk store, resumably."""
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        output_dir: str,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[float] = 3000,
+        tokens_per_minute: float = 1_000_000,
+    ):
+        """Initialize the ingestor with an embedding model and output directory.
+
+        Pass requests_per_minute=None when the embedding model is already rate
+        limited, e.g. by the shared OpenAI client pool.
+        """
+        self.embed_model = embed_model
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = (
+            RateLimiter(requests_per_minute, tokens_per_minute)
+            if requests_per_minute is not None
+            else None
+        )
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.output_dir, name)
+
+    def load_checkpoint(self, source: str) -> Dict[str, Any]:
+        """Load the checkpoint and drop output written after it."""
+        checkpoint = {
+            "source": os.path.abspath(source),
+            "lines_done": 0,
+            "documents": 0,
+            "dimensions": None,
+            "nodes_bytes": 0,
+        }
+        if os.path.exists(self._path(CHECKPOINT_FILE)):
+            with open(self._path(CHECKPOINT_FILE), "r") as checkpoint_file:
+                saved = json.load(checkpoint_file)
+            if saved["source"] != checkpoint["source"]:
+                raise ValueError(
+                    f"{self.output_dir} holds an ingestion of {saved['source']}"
+                )
+            checkpoint = saved
+
+        # Truncate anything an interrupted run appended after the checkpoint
+        embeddings_bytes = (
+            checkpoint["documents"] * (checkpoint["dimensions"] or 0) * FLOAT_SIZE
+        )
+        for name, size in (
+            (NODES_FILE, checkpoint["nodes_bytes"]),
+            (EMBEDDINGS_FILE, embeddings_bytes),
+        ):
+            with open(self._path(name), "ab") as output_file:
+                output_file.truncate(size)
+        return checkpoint
+
+    def save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        tmp_path = self._path(CHECKPOINT_FILE + ".tmp")
+        with open(tmp_path, "w") as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(tmp_path, self._path(CHECKPOINT_FILE))
+
+    def _batches(
+        self, source: str, skip_lines: int
+    ) -> Iterator[Tuple[int, List[Document]]]:
+        batch: List[Document] = []
+        for line_number, record in iter_jsonl(source, skip_lines):
+            batch.append(Document(**record))
+            if len(batch) == self.batch_size:
+                yield line_number, batch
+                batch = []
+        if batch:
+            yield line_number, batch
+
+    async def _embed(self, documents: List[Document]) -> List[List[float]]:
+        texts = [doc.get_content(metadata_mode=MetadataMode.EMBED) for doc in documents]
+        if self.rate_limiter is not None:
+            # Rough token estimate, good enough for budgeting against rate limits
+            await self.rate_limiter.acquire(sum(len(text) for text in texts) // 4)
+        return await self.embed_model.aget_text_embedding_batch(texts)
+
+    def _append(
+        self,
+        nodes_file,
+        embeddings_file,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        checkpoint: Dict[str, Any],
+    ) -> None:
+        for doc, embedding in zip(documents, embeddings):
+            if checkpoint["dimensions"] is None:
+                checkpoint["dimensions"] = len(embedding)
+            elif len(embedding) != checkpoint["dimensions"]:
+                raise ValueError("Embedding dimensions changed during ingestion")
+            node = {"id_": doc.id_, "text": doc.text, "metadata": doc.metadata}
+            nodes_file.write((json.dumps(node) + "\n").encode("utf-8"))
+            array("f", embedding).tofile(embeddings_file)
+        nodes_file.flush()
+        embeddings_file.flush()
+        os.fsync(nodes_file.fileno())
+        os.fsync(embeddings_file.fileno())
+
+    async def ingest(self, source: str) -> Dict[str, Any]:
+        """Ingest a JSONL file, resuming from the last checkpoint if there is one."""
+        checkpoint = self.load_checkpoint(source)
+        started = time.perf_counter()
+        ingested = 0
+        pending: deque = deque()
+
+        with open(self._path(NODES_FILE), "ab") as nodes_file, open(
+            self._path(EMBEDDINGS_FILE), "ab"
+        ) as embeddings_file:
+
+            async def commit_oldest() -> None:
+                nonlocal ingested
+                line_number, documents, task = pending.popleft()
+                embeddings = await task
+                self._append(
+                    nodes_file, embeddings_file, documents, embeddings, checkpoint
+                )
+                checkpoint["lines_done"] = line_number
+                checkpoint["documents"] += len(documents)
+                checkpoint["nodes_bytes"] = nodes_file.tell()
+                self.save_checkpoint(checkpoint)
+                ingested += len(documents)
+
+            try:
+                for line_number, documents in self._batches(
+                    source, checkpoint["lines_done"]
+                ):
+                    pending.append(
+                        (
+                            line_number,
+                            documents,
+                            asyncio.ensure_future(self._embed(documents)),
+                        )
+                    )
+                    # Batches are committed in input order so the checkpoint is a prefix
+                    if len(pending) >= self.max_concurrency:
+                        await commit_oldest()
+                while pending:
+                    await commit_oldest()
+            finally:
+                for _, _, task in pending:
+                    task.cancel()
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "documents": ingested,
+            "total_documents": checkpoint["documents"],
+            "seconds": elapsed,
+            "documents_per_second": ingested / elapsed if elapsed else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        logging.info(f"Ingestion finished: {stats}")
+        return stats
+
+
+def iter_ingested_nodes(output_dir: str) -> Iterator[TextNode]:
+    """Yield the ingested nodes with their embeddings attached."""
+    with open(os.path.join(output_dir, CHECKPOINT_FILE), "r") as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    dimensions = checkpoint["dimensions"]
+
+    with open(os.path.join(output_dir, NODES_FILE), "r") as nodes_file, open(
+        os.path.join(output_dir, EMBEDDINGS_FILE), "rb"
+    ) as embeddings_file:
+        for _, line in zip(range(checkpoint["documents"]), nodes_file):
+            embedding = array("f")
+            embedding.fromfile(embeddings_file, dimensions)
+            yield TextNode(**json.loads(line), embedding=embedding.tolist())
+
+
+def load_ingested_index(output_dir: str, batch_size: int = 1024) -> VectorStoreIndex:
+    """Build a vector index from an ingested store without re-embedding.
+
+    Nodes are streamed into the index in batches, so apart from the index
+    itself no copy of the corpus is held in memory. The index is an in-memory
+    SimpleVectorStore, so unlike the store it must fit in RAM.
+    """
+    index = VectorStoreIndex([])
+    batch: List[TextNode] = []
+    for node in iter_ingested_nodes(output_dir):
+        batch.append(node)
+        if len(batch) == batch_size:
+            index.insert_nodes(batch)
+            batch = []
+    if batch:
+        index.insert_nodes(batch)
+    return index
+
+
+def ingest_jsonl_index(
+    source: str,
+    output_dir: str,
+    embed_model: BaseEmbedding,
+    async_http_client: Optional[httpx.AsyncClient] = None,
+    **kwargs: Any,
+) -> VectorStoreIndex:
+    """Ingest (or resume ingesting) a JSONL corpus and return it as a vector index.
+
+    The ingestion runs in its own event loop. Give `embed_model` an async HTTP
+    client of its own and pass it as `async_http_client` to have it closed
+    before that loop ends.
+    """
+    ingestor = StreamingIngestor(embed_model, output_dir, **kwargs)
+
+    async def ingest() -> None:
+        try:
+            await ingestor.ingest(source)
+        finally:
+            if async_http_client is not None:
+                await async_http_client.aclose()
+
+    asyncio.run(ingest())
+    return load_ingested_index(output_dir)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="JSONL file with one document per line")
+    parser.add_argument("output", help="Output directory for the ingested store")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--requests-per-minute", type=float, default=3000)
+    parser.add_argument("--tokens-per-minute", type=float, default=1_000_000)
+    parser.add_argument("--model", default="text-embedding-3-large")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from llama_index.embeddings.openai import OpenAIEmbedding
+    from utils.openai_pool import OpenAIClientPool, background_priority
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    # The pool is the only rate limiter; nothing interactive runs in this
+    # process, so the background work may use the whole budget
+    openai_pool = OpenAIClientPool(
+        model_limits={args.model: (args.requests_per_minute, args.tokens_per_minute)},
+        background_reserve=0.0,
+    )
+    ingestor = StreamingIngestor(
+        OpenAIEmbedding(
+            model=args.model,
+            embed_batch_size=args.batch_size,
+            **openai_pool.llama_index_kwargs(),
+        ),
+        args.output,
+        batch_size=args.batch_size,
+        max_concurrency=args.max_concurrency,
+        requests_per_minute=None,
+    )
+    with background_priority():
+        stats = asyncio.run(ingestor.ingest(args.source))
+    print(
+        f"Ingested {stats['documents']} documents ({stats['total_documents']} total) "
+        f"at {stats['documents_per_second']:.1f} docs/s, "
+        f"peak RSS {stats['peak_rss_mb']:.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import asyncio
+import contextvars
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    get_args,
+)
+
+from llama_index.agent.openai.step import OpenAIAgentWorker
+from llama_index.core.agent.types import Task, TaskStep, TaskStepOutput
+from llama_index.core.agent.utils import add_user_step_to_memory
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+from llama_index.core.chat_engine.types import ChatResponseMode
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.tools import BaseTool, FunctionTool, ToolMetadata, ToolOutput
+from llama_index.core.tools.function_tool import sync_to_async
+from llama_index.core.tools.types import AsyncBaseTool, adapt_to_async_tool
+from llama_index.llms.openai.utils import OpenAIToolCall
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TOOL_TIMEOUT = 60.0
+
+# FunctionTool wraps a sync-only fn with sync_to_async; every such wrapper
+# shares this code object
+_SYNC_TO_ASYNC_CODE = sync_to_async(lambda: None).__code__
+
+
+def has_native_async(tool: FunctionTool) -> bool:
+    """Whether a function tool was given a real async_fn, not a wrapped sync fn."""
+    return getattr(tool.async_fn, "__code__", None) is not _SYNC_TO_ASYNC_CODE
+
+
+class ToolScheduler:
+    """Runs independent tool calls concurrently.
+
+    Async tools (e.g. query engine tools, or function tools built with an
+    `async_fn`) are awaited on the event loop, while plain Python function
+    tools are dispatched to a bounded thread pool so that blocking work such
+    as HTTP requests or corpus scans does not stall the loop.
+    Every call is subject to a timeout and results are returned in call order.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        timeout: Optional[float] = DEFAULT_TOOL_TIMEOUT,
+    ):
+        """Initialize the scheduler with a bounded thread pool."""
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="tool-scheduler"
+        )
+
+    def wrap(self, tool: BaseTool) -> "ScheduledTool":
+        """Wrap a tool so that its async calls go through this scheduler."""
+        if isinstance(tool, ScheduledTool):
+            return tool
+        return ScheduledTool(tool, self)
+
+    async def run(self, tool: BaseTool, kwargs: dict) -> ToolOutput:
+        """Run a single tool call with the configured timeout."""
+        try:
+            return await asyncio.wait_for(self._dispatch(tool, kwargs), self.timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                f"Tool {tool.metadata.name} timed out after {self.timeout}s"
+            )
+            return self._error_output(
+                tool, kwargs, f"Error: tool timed out after {self.timeout}s"
+            )
+        except Exception as e:
+            logging.error(f"Error running tool {tool.metadata.name}: {str(e)}")
+            return self._error_output(tool, kwargs, f"Error: {e!s}", raw_output=e)
+
+    async def gather(self, calls: Sequence[Tuple[BaseTool, dict]]) -> List[ToolOutput]:
+        """Run all tool calls concurrently and return outputs in call order."""
+        return list(
+            await asyncio.gather(*[self.run(tool, kwargs) for tool, kwargs in calls])
+        )
+
+    async def gather_awaitables(
+        self, factories: Sequence[Callable[[], Awaitable[Any]]]
+    ) -> List[Any]:
+        """Await several coroutine factories concurrently, preserving order."""
+        return list(await asyncio.gather(*[factory() for factory in factories]))
+
+    async def _dispatch(self, tool: BaseTool, kwargs: dict) -> ToolOutput:
+        if isinstance(tool, FunctionTool) and not has_native_async(tool):
+            # Sync function tools wrap blocking code, run them on the pool
+            # with the caller's context so session lookups keep working
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(
+                self.executor, lambda: context.run(tool, **kwargs)
+            )
+        return await adapt_to_async_tool(tool).acall(**kwargs)
+
+    @staticmethod
+    def _error_output(
+        tool: BaseTool, kwargs: dict, message: str, raw_output: Any = None
+    ) -> ToolOutput:
+        return ToolOutput(
+            content=message,
+            tool_name=tool.metadata.name,
+            raw_input={"kwargs": kwargs},
+            raw_output=raw_output,
+            is_error=True,
+        )
+
+    def shutdown(self) -> None:
+        """Release the worker threads."""
+        self.executor.shutdown(wait=False)
+
+
+class ScheduledTool(AsyncBaseTool):
+    """Tool wrapper that routes async calls through a ToolScheduler."""
+
+    def __init__(self, tool: BaseTool, scheduler: ToolScheduler):
+        self.base_tool = tool
+        self.scheduler = scheduler
+
+    @property
+    def metadata(self) -> ToolMetadata:
+        return self.base_tool.metadata
+
+    def call(self, *args: Any, **kwargs: Any) -> ToolOutput:
+        return self.base_tool(*args, **kwargs)
+
+    async def acall(self, *args: Any, **kwargs: Any) -> ToolOutput:
+        if args:
+            kwargs = {"input": args[0], **kwargs}
+        return await self.scheduler.run(self.base_tool, kwargs)
+
+
+class ParallelOpenAIAgentWorker(OpenAIAgentWorker):
+    """OpenAI agent worker that executes the tool calls of one step concurrently.
+
+    Each tool call writes into its own scratch memory; once all calls have
+    finished the tool messages are replayed into the task memory in the order
+    the model requested them, so the conversation stays deterministic.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        scheduler: Optional[ToolScheduler] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.scheduler = scheduler or ToolScheduler()
+
+    def get_tools(self, input: str) -> List[BaseTool]:
+        """Get tools, wrapped by the scheduler."""
+        return [self.scheduler.wrap(tool) for tool in self._get_tools(input)]
+
+    async def _arun_step(
+        self,
+        step: TaskStep,
+        task: Task,
+        mode: ChatResponseMode = ChatResponseMode.WAIT,
+        tool_choice: Union[str, dict] = "auto",
+    ) -> TaskStepOutput:
+        """Run step (async), executing independent tool calls concurrently."""
+        if step.input is not None:
+            add_user_step_to_memory(
+                step, task.extra_state["new_memory"], verbose=self._verbose
+            )
+
+        tools = self.get_tools(task.input)
+        openai_tools = [tool.metadata.to_openai_tool() for tool in tools]
+
+        llm_chat_kwargs = self._get_llm_chat_kwargs(task, openai_tools, tool_choice)
+        agent_chat_response = await self._get_async_agent_response(
+            task, mode=mode, **llm_chat_kwargs
+        )
+
+        latest_tool_calls = self.get_latest_tool_calls(task) or []
+        latest_tool_outputs: List[ToolOutput] = []
+
+        if not self._should_continue(
+            latest_tool_calls, task.extra_state["n_function_calls"]
+        ):
+            is_done = True
+        else:
+            is_done = False
+            for tool_call in latest_tool_calls:
+                if not isinstance(tool_call, get_args(OpenAIToolCall)):
+                    raise ValueError("Invalid tool_call object")
+
+                if tool_call.type != "function":
+                    raise ValueError("Invalid tool type. Unsupported by OpenAI")
+
+            call_memories = [
+                ChatMemoryBuffer.from_defaults() for _ in latest_tool_calls
+            ]
+            call_sources: List[List[ToolOutput]] = [[] for _ in latest_tool_calls]
+            return_directs = await self.scheduler.gather_awaitables(
+                [
+                    lambda i=i, tool_call=tool_call: self._acall_function(
+                        tools, tool_call, call_memories[i], call_sources[i]
+                    )
+                    for i, tool_call in enumerate(latest_tool_calls)
+                ]
+            )
+
+            # Replay tool messages and sources in the order they were requested
+            for memory, sources in zip(call_memories, call_sources):
+                for message in memory.get_all():
+                    task.extra_state["new_memory"].put(message)
+                latest_tool_outputs.extend(sources)
+                task.extra_state["sources"].extend(sources)
+            task.extra_state["n_function_calls"] += len(latest_tool_calls)
+
+            if len(latest_tool_calls) == 1 and return_directs[0]:
+                is_done = True
+                response_str = latest_tool_outputs[-1].content
+                chat_response = ChatResponse(
+                    message=ChatMessage(
+                        role=MessageRole.ASSISTANT, content=response_str
+                    )
+                )
+                agent_chat_response = self._process_message(task, chat_response)
+                agent_chat_response.is_dummy_stream = mode == ChatResponseMode.STREAM
+
+        new_steps = (
+            [step.get_next_step(step_id=str(uuid.uuid4()), input=None)]
+            if not is_done
+            else []
+        )
+
+        # Attach all tool outputs from this step as sources
+        agent_chat_response.sources = latest_tool_outputs
+
+        return TaskStepOutput(
+            output=agent_chat_response,
+            task_step=step,
+            is_last=is_done,
+            next_steps=new_steps,
+        )